@@ -1,22 +1,108 @@
 import os
+import threading
+from importlib.metadata import version, PackageNotFoundError
 from textwrap import dedent
 from crewai import Agent
-from langchain_openai import ChatOpenAI
-from crewai_tools import SerperDevTool, ScrapeWebsiteTool
+from tool_cache import CachedSerperDevTool, CachedScrapeWebsiteTool
+from metrics import MetricsCallbackHandler
+from streaming import StreamingCallbackHandler
 import logging
 
 # Set up logging to handle any potential errors
 logging.basicConfig(level=logging.ERROR)
 
+# From this release on crewai replaces a langchain chat model with its own
+# LLM, which would bypass the routing, rate limiting and callbacks below
+LANGCHAIN_CREWAI_BEFORE = (0, 60)
+
+
+def check_crewai_version():
+    try:
+        release = tuple(int(part) for part in version("crewai").split(".")[:2])
+    except (PackageNotFoundError, ValueError):
+        return
+    if release >= LANGCHAIN_CREWAI_BEFORE:
+        logging.error(f"crewai {version('crewai')} does not accept langchain chat models")
+        raise RuntimeError(f"crewai {version('crewai')} is not supported; install the version pinned in requirements.txt")
+
+
 class MarketingAnalysisAgents:
-    def __init__(self):
+    def __init__(self, model_name="gpt-4o-mini", openai_api_key=None, llm=None, search_tool=None, scrape_tool=None, streaming=False, research_tool=None):
+        # llm and the tools can be injected, e.g. offline stand-ins for benchmarks
         try:
-            self.llm = ChatOpenAI(model_name="gpt-4o-mini")
-            self.serper_dev_tool = SerperDevTool()
-            self.scrape_website_tool = ScrapeWebsiteTool()
+            self.routes = {}
+            if llm is None:
+                check_crewai_version()
+                from openai_client import chat_openai
+                from routing import RoutedChatModel, load_routes
+                llm_kwargs = {"openai_api_key": openai_api_key} if openai_api_key else {}
+                if streaming:
+                    # Token usage is only reported for streams when asked for
+                    llm_kwargs.update(streaming=True, stream_usage=True)
+                callbacks = [MetricsCallbackHandler(), StreamingCallbackHandler()]
+                clients = {}
+                for name, route in load_routes(model_name).items():
+                    # One client per model and budget, shared by the routes using it
+                    models = [model for model in (route["model"], route["fallback"]) if model]
+                    for model in models:
+                        if (model, route["budget_s"]) not in clients:
+                            clients[(model, route["budget_s"])] = chat_openai(
+                                model_name=model, timeout=route["budget_s"], callbacks=callbacks, **llm_kwargs
+                            )
+                    self.routes[name] = RoutedChatModel(
+                        route=name,
+                        model_name=route["model"],
+                        fallback=route["fallback"] if route["fallback"] != route["model"] else None,
+                        budget_s=route["budget_s"],
+                        hedge_after_s=route["hedge_after_s"],
+                        clients={model: clients[(model, route["budget_s"])] for model in models},
+                    )
+                llm = chat_openai(model_name=model_name, callbacks=callbacks, **llm_kwargs)
+            self.llm = llm
+            # Cached wrappers share results across all agents and sessions
+            self.serper_dev_tool = search_tool or CachedSerperDevTool()
+            self.scrape_website_tool = scrape_tool or CachedScrapeWebsiteTool()
+            # Listed first so agents consult past research before the web
+            if research_tool is None:
+                from research_index import ResearchIndexTool
+                research_tool = ResearchIndexTool()
+            self.research_tool = research_tool
         except Exception as e:
             logging.error(f"Failed to initialize LLM or tools: {e}")
             raise
+        # Idle agents by factory name, reused across runs and sessions
+        self._idle_agents = {}
+        self._agent_names = {}
+        self._checked_out = set()
+        self._pool_lock = threading.Lock()
+
+    def llm_for(self, name):
+        # Routed model for an agent factory, or the shared llm when none is set
+        return self.routes.get(name, self.llm)
+
+    def acquire(self, name):
+        # An Agent keeps its executor state on the instance, so one instance
+        # is never handed to two tasks at the same time.
+        with self._pool_lock:
+            idle = self._idle_agents.get(name)
+            if idle:
+                agent = idle.pop()
+                self._checked_out.add(id(agent))
+                return agent
+        agent = getattr(self, name)()
+        with self._pool_lock:
+            self._agent_names[id(agent)] = name
+            self._checked_out.add(id(agent))
+        return agent
+
+    def release(self, agent):
+        # Releasing twice must not list one instance as idle twice, or two
+        # concurrent tasks (e.g. product and competitor analysis) would get it
+        with self._pool_lock:
+            name = self._agent_names.get(id(agent))
+            if name and id(agent) in self._checked_out:
+                self._checked_out.discard(id(agent))
+                self._idle_agents.setdefault(name, []).append(agent)
 
     def product_competitor_agent(self):
         try:
@@ -31,11 +117,12 @@ class MarketingAnalysisAgents:
                     digital marketing firm, you specialize in dissecting
                     online business landscapes."""),
                 tools=[
+                    self.research_tool,
                     self.serper_dev_tool,
                     self.scrape_website_tool
                 ],
                 allow_delegation=False,
-                llm=self.llm,
+                llm=self.llm_for("product_competitor_agent"),
                 verbose=True
             )
         except Exception as e:
@@ -54,10 +141,11 @@ class MarketingAnalysisAgents:
                     a leading digital marketing agency, known for crafting
                     bespoke strategies that drive success."""),
                 tools=[
+                    self.research_tool,
                     self.serper_dev_tool,
                     self.scrape_website_tool
                 ],
-                llm=self.llm,
+                llm=self.llm_for("strategy_planner_agent"),
                 verbose=True
             )
         except Exception as e:
@@ -80,10 +168,11 @@ class MarketingAnalysisAgents:
                     into engaging stories and visual content that capture
                     attention and inspire action."""),
                 tools=[
+                    self.research_tool,
                     self.serper_dev_tool,
                     self.scrape_website_tool
                 ],
-                llm=self.llm,
+                llm=self.llm_for("creative_content_creator_agent"),
                 verbose=True
             )
         except Exception as e:
@@ -103,10 +192,11 @@ class MarketingAnalysisAgents:
                     inspire and engage, you're now working on a new campaign for a super
                     important customer and you need to take the most amazing photograph."""),
                 tools=[
+                    self.research_tool,
                     self.serper_dev_tool,
                     self.scrape_website_tool
                 ],
-                llm=self.llm,
+                llm=self.llm_for("senior_photographer_agent"),
                 allow_delegation=False,
                 verbose=True
             )
@@ -129,10 +219,11 @@ class MarketingAnalysisAgents:
                     customer, trying to make sure your team is crafting the best possible
                     content for the customer."""),
                 tools=[
+                    self.research_tool,
                     self.serper_dev_tool,
                     self.scrape_website_tool
                 ],
-                llm=self.llm,
+                llm=self.llm_for("chief_creative_director_agent"),
                 verbose=True
             )
         except Exception as e:
@@ -1,41 +1,18 @@
 import streamlit as st
 import os
-import re
-import sys
-from datetime import datetime
+import time
+import logging
 from dotenv import load_dotenv, set_key
-from crewai import Crew, Process
-from agents import MarketingAnalysisAgents
-from tasks import MarketingAnalysisTasks
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_community.utilities.dalle_image_generator import DallEAPIWrapper
+from pipeline import run_campaign, MAX_VARIANTS, COUNTRIES, AUDIENCES, PLATFORMS, TONES, IMAGE_STYLES
+from jobs import job_manager, QUEUED, RUNNING, FAILED, INTERRUPTED
+from resources import get_agents, get_tasks, get_chat_client, get_task_cache, get_stage_store, get_results_store
+from metrics import RunMetrics, write_prometheus, serve_prometheus
+from streaming import TaskStreams
+from results import render_text, FILTERS
 
 # Load environment variables
 load_dotenv()
 
-class StreamToExpander:
-    def __init__(self, expander, buffer_limit=10000):
-        self.expander = expander
-        self.buffer = []
-        self.buffer_limit = buffer_limit
-
-    def write(self, data):
-        cleaned_data = re.sub(r'\x1B\[\d+;?\d*m', '', data)
-        if len(self.buffer) >= self.buffer_limit:
-            self.buffer.pop(0)
-        self.buffer.append(cleaned_data)
-
-        if "\n" in data:
-            self.expander.markdown(''.join(self.buffer), unsafe_allow_html=True)
-            self.buffer.clear()
-
-    def flush(self):
-        if self.buffer:
-            self.expander.markdown(''.join(self.buffer), unsafe_allow_html=True)
-            self.buffer.clear()
-
 # Set page config
 st.set_page_config(
     page_title='Australia Travel Safe Marketing Strategy',
@@ -64,145 +41,226 @@ except Exception as e:
 
 # Sidebar options for customization
 st.sidebar.title("Customization Options")
-country_list = ["None", "Australia", "USA", "Canada", "UK", "India", "Germany"]  # Add more countries as needed
+country_list = ["None"] + COUNTRIES
 selected_country = st.sidebar.selectbox("Select Country", country_list)
-target_audience = st.sidebar.selectbox("Target Audience", ["None", "Teens", "Adults", "Professionals"])
-platform = st.sidebar.selectbox("Platform", ["None", "Instagram", "Facebook", "Twitter", "LinkedIn"])
-tone_of_voice = st.sidebar.selectbox("Tone of Voice", ["None", "Formal", "Casual", "Humorous", "Inspirational"])
+target_audience = st.sidebar.selectbox("Target Audience", ["None"] + AUDIENCES)
+platform = st.sidebar.selectbox("Platform", ["None"] + PLATFORMS)
+tone_of_voice = st.sidebar.selectbox("Tone of Voice", ["None"] + TONES)
 keywords = st.sidebar.text_input("Keywords (comma separated)")
-image_style = st.sidebar.selectbox("Image Style", ["None", "Minimalist", "Vintage", "Modern", "Artistic"])
+image_style = st.sidebar.selectbox("Image Style", ["None"] + IMAGE_STYLES)
+ad_copy_candidates = st.sidebar.slider("Ad copy candidates", min_value=1, max_value=MAX_VARIANTS, value=1,
+                                       help="Generate several ad copy candidates in parallel and keep the three most different ones")
+refresh_cache = st.sidebar.checkbox("Refresh cached results", value=False)
+stream_output = st.sidebar.checkbox("Stream output while generating", value=True)
 
-# Initialize OpenAI client
-try:
-    if openai_api_key:
-        openai_client = ChatOpenAI(openai_api_key=openai_api_key)
-    else:
-        st.error("Please provide your OpenAI API key in the sidebar.")
-except Exception as e:
-    st.error(f"Failed to initialize OpenAI client: {e}")
+if not openai_api_key:
+    st.error("Please provide your OpenAI API key in the sidebar.")
 
-# Initialize tasks and agents
-try:
-    tasks = MarketingAnalysisTasks()
-    agents = MarketingAnalysisAgents()
-except Exception as e:
-    # st.error(f"Failed to initialize tasks and agents: {e}")
-    pass
+# Task and stage results are cached on disk and shared by every session.
+# The stores are process singletons, so polling reruns do not rebuild them.
+task_cache = get_task_cache()
+stage_store = get_stage_store()
+# Every finished run is kept in an indexed store instead of loose text files
+results_store = get_results_store()
 
-def generate_content():
-    expander = st.expander("Crew Log")
-    sys.stdout = StreamToExpander(expander)
+# Optional Prometheus scrape endpoint, started once per process
+if os.getenv("METRICS_PORT"):
+    serve_prometheus(int(os.getenv("METRICS_PORT")))
 
+# Seconds between refreshes while a job is running
+POLL_INTERVAL = 0.5
+# Characters of the crew log shown while a job is running
+LOG_TAIL_CHARS = 4000
+
+def generation_job(job, options, openai_api_key, serper_api_key, refresh, streaming):
+    # Runs on the job pool, outside the script thread, so it must not call
+    # Streamlit; everything the page needs goes into the returned result.
+    run_metrics = RunMetrics(run_id=job.id, labels=options)
+    metrics_token = run_metrics.start()
+    streams = TaskStreams()
+    streams_token = streams.attach()
+    if streaming:
+        job.streams = streams
     try:
-        # Create Agents
-        product_competitor_agent = agents.product_competitor_agent()
-        strategy_planner_agent = agents.strategy_planner_agent()
-        creative_agent = agents.creative_content_creator_agent()
-        senior_photographer = agents.senior_photographer_agent()
-        chief_creative_director = agents.chief_creative_director_agent()
-
-        # Initialize Tasks
-        website_analysis = tasks.product_analysis(product_competitor_agent, selected_country) if selected_country != "None" else None
-        market_analysis = tasks.competitor_analysis(product_competitor_agent, selected_country) if selected_country != "None" else None
-
-        # Generate marketing campaign and ad copy if options are selected
-        campaign_development = None
-        write_copy = None
-        if platform != "None" and tone_of_voice != "None" and target_audience != "None":
-            campaign_development = tasks.campaign_development(strategy_planner_agent, platform=platform, tone=tone_of_voice, audience=target_audience, country=selected_country)
-            write_copy = tasks.instagram_ad_copy(creative_agent, keywords=keywords, country=selected_country)
-
-        # Create Crew responsible for Copy
-        copy_crew_tasks = []
-        if website_analysis:
-            copy_crew_tasks.append(website_analysis)
-        if market_analysis:
-            copy_crew_tasks.append(market_analysis)
-        if campaign_development:
-            copy_crew_tasks.append(campaign_development)
-        if write_copy:
-            copy_crew_tasks.append(write_copy)
-
-        copy_crew = Crew(
-            agents=[
-                product_competitor_agent,
-                strategy_planner_agent,
-                creative_agent
-            ],
-            tasks=copy_crew_tasks
+        # Product pages are fetched and extracted while the agents start up
+        from web_fetch import web_fetcher
+        from tasks import PRODUCT_URLS
+        from research_index import research_index
+        web_fetcher.prefetch(PRODUCT_URLS)
+
+        # Agents, tools and LLM clients are built once per process and API key
+        agents = get_agents(openai_api_key=openai_api_key, serper_api_key=serper_api_key, streaming=streaming)
+        tasks = get_tasks()
+
+        # Independent tasks run concurrently
+        campaign = run_campaign(
+            agents,
+            tasks,
+            options,
+            runner=lambda task, context: task_cache.execute(task, context=context, refresh=refresh),
+            on_progress=job.progress,
+            stage_store=stage_store,
+            refresh=refresh,
+            research_index=research_index,
         )
+        ad_copy = campaign["ad_copy"]
 
-        ad_copy = copy_crew.kickoff() if copy_crew_tasks else None
-
-        # Create Tasks for Image
-        image_description = None
-        if image_style != "None" and ad_copy:
-            take_photo = tasks.take_photograph_task(senior_photographer, ad_copy, style=image_style, country=selected_country)
-            approve_photo = tasks.review_photo(chief_creative_director, country=selected_country)
-            image_crew = Crew(
-                agents=[
-                    senior_photographer,
-                    chief_creative_director
-                ],
-                tasks=[
-                    take_photo,
-                    approve_photo
-                ]
-            )
-            image_description = image_crew.kickoff()
-
-        # Generate and Display Image using DALL-E
-        def generate_image(description):
-            try:
-                if description:
-                    prompt_template = PromptTemplate(
-                        input_variables=["image_desc"],
-                        template="Generate an image based on the following description: {image_desc}"
-                    )
-                    prompt = prompt_template.format(image_desc=description)
-                    chain = LLMChain(llm=openai_client, prompt=prompt_template)
-                    image_url = DallEAPIWrapper().run(chain.run(prompt))
-                    return image_url
-                return None
-            except Exception as e:
-                st.error(f"Failed to generate image: {e}")
-                return None
-
-        image_url = generate_image(image_description) if image_description else None
-
-        # Display Results
-        st.markdown("## Here is the result")
-        if ad_copy:
-            st.markdown("### Your post copy:")
-            st.write(ad_copy)
-
-        if image_url:
-            st.markdown("### Your Generated Image:")
-            st.image(image_url, caption="Generated Image", use_column_width=True)
-
-        # Save results to a text file with utf-8 encoding
+        # Generate the reviewed photo options concurrently with DALL-E
+        images, image_errors = [], []
+        if campaign["image_description"]:
+            job.progress("Generating images")
+            from images import generate_images
+            images, image_errors = generate_images(campaign["image_description"], options["image_style"], llm=get_chat_client(openai_api_key))
+    finally:
+        streams.detach(streams_token)
+        run_metrics.finish(metrics_token)
         try:
-            filename = f"generated_content_{datetime.today().strftime('%Y-%m-%d_%H-%M-%S')}.txt"
-            with open(filename, 'w', encoding='utf-8') as f:
-                if ad_copy:
-                    f.write(f"Instagram Caption:\n{ad_copy}\n\n")
-                if image_url:
-                    f.write(f"Generated Image URL: {image_url}\n")
-
-            # Download link for the text file
-            with open(filename, "rb") as f:
-                st.download_button(
-                    label="Download Captions and Image Info",
-                    data=f,
-                    file_name=filename,
-                    mime="text/plain"
-                )
-        except Exception as e:
-            st.error(f"Failed to save and provide download link: {e}")
+            run_metrics.write_trace()
+            write_prometheus()
+        except OSError as e:
+            logging.error(f"Failed to write performance metrics: {e}")
+
+    result = {
+        "run_id": job.id,
+        "ad_copy": ad_copy,
+        "images": images,
+        "image_errors": image_errors,
+        "stages": campaign["stages"],
+        "token_savings": campaign["token_savings"],
+        "prompt_tokens": campaign["prompt_tokens"],
+        # Searches and scrapes of this run; the caches themselves are shared
+        "tool_cache": run_metrics.cache_stats(),
+        "metrics": run_metrics.summary(),
+        "latency": [
+            {"task": name, "ttft_s": section["ttft_s"], "complete_s": section["complete_s"]}
+            for name, section in streams.snapshot().items()
+        ],
+        "duration": run_metrics.duration,
+    }
+    try:
+        results_store.save(job.id, options, result, outputs=campaign["outputs"])
     except Exception as e:
-        st.error(f"An error occurred during content generation: {e}")
-    finally:
-        sys.stdout = sys.__stdout__
+        logging.error(f"Failed to store results: {e}")
+    return result
+
+def show_result(result):
+    # Display Results
+    st.markdown("## Here is the result")
+    if result["ad_copy"]:
+        st.markdown("### Your post copy:")
+        st.write(result["ad_copy"])
+
+    if result["images"]:
+        st.markdown("### Your Generated Images:")
+        for image in result["images"]:
+            st.image(image["path"], caption=image["description"], use_column_width=True)
+    # Results stored before image errors were recorded have none
+    for error in result.get("image_errors", []):
+        st.error(error)
+
+    if result["stages"]:
+        st.caption("Stages: " + ", ".join(f"{stage['stage']} {stage['status']}" for stage in result["stages"]))
+    stats = result["tool_cache"]
+    st.caption(f"Tool cache: {stats['hits'] + stats['disk_hits']} hits, {stats['misses']} misses, {stats['coalesced']} coalesced")
+    saved = sum(item["tokens_saved"] for item in result["token_savings"])
+    st.caption(f"Context compaction: {saved} prompt tokens saved across {len(result['prompt_tokens'])} tasks")
+
+    show_download(result["run_id"], result["ad_copy"], result["images"])
+
+    with st.expander("Performance"):
+        st.caption(f"Run took {result['duration']:.1f}s")
+        st.dataframe(result["metrics"], use_container_width=True)
+        if result["latency"]:
+            st.caption("Time to first token and to completion per task")
+            st.dataframe(result["latency"], use_container_width=True)
+
+def show_download(run_id, ad_copy, images):
+    # Served from memory; nothing is written to the working directory
+    st.download_button(
+        label="Download Captions and Image Info",
+        data=render_text(ad_copy, images),
+        file_name=f"generated_content_{run_id}.txt",
+        mime="text/plain",
+        key=f"download_{run_id}"
+    )
+
+def show_past_runs(filters):
+    runs = results_store.list_runs(limit=20, **filters)
+    if not runs:
+        st.caption("No past campaigns match the selected options.")
+        return
+    labels = {
+        run["id"]: f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(run['created']))} - "
+                   f"{run['country']}, {run['platform']}, {run['tone']}, {run['audience']}"
+        for run in runs
+    }
+    run_id = st.selectbox("Past campaign", list(labels), format_func=labels.get)
+    run = results_store.get(run_id)
+    if run is None:
+        return
+    if run["ad_copy"]:
+        st.write(run["ad_copy"])
+    for image in run["images"]:
+        if os.path.exists(image["path"]):
+            st.image(image["path"], caption=image["description"], use_column_width=True)
+    show_download(run["id"], run["ad_copy"], run["images"])
+
+def show_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        st.warning("This generation job could not be found.")
+        st.session_state.pop("job_id", None)
+        st.query_params.clear()
+        return
+
+    with st.expander("Crew Log"):
+        log = job["log"]
+        if job["status"] in (QUEUED, RUNNING) and len(log) > LOG_TAIL_CHARS:
+            # Every poll re-sends the log, so only its latest lines are shown
+            # until the job has finished
+            log = "[...]\n" + log[-LOG_TAIL_CHARS:]
+        st.code(log, language=None)
+
+    if job["status"] in (QUEUED, RUNNING):
+        st.info(f"Generating your marketing strategy ({job['status']}). You can leave or refresh this page and come back.")
+        for event in job["events"][-5:]:
+            st.caption(event["message"])
+        # Final answers render progressively as their tokens stream in
+        for name, section in job["sections"].items():
+            if section["text"]:
+                st.markdown(f"#### {name.replace('_', ' ').capitalize()}")
+                st.write(section["text"])
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
+    elif job["status"] == FAILED:
+        st.error(f"An error occurred during content generation: {job['error']}")
+    elif job["status"] == INTERRUPTED:
+        st.warning("This job was interrupted by a server restart. Please generate again.")
+    else:
+        show_result(job["result"])
 
 if st.button("Generate Marketing Strategy"):
-    generate_content()
+    options = {
+        "country": selected_country,
+        "platform": platform,
+        "tone": tone_of_voice,
+        "audience": target_audience,
+        "keywords": keywords,
+        "image_style": image_style,
+        "variants": ad_copy_candidates,
+    }
+    job_id = job_manager.submit(options, generation_job, openai_api_key or None, serper_api_key or None, refresh_cache, stream_output)
+    st.session_state["job_id"] = job_id
+    # Keeps the job reachable after a page refresh
+    st.query_params["job"] = job_id
+
+# Past campaigns for the options selected in the sidebar
+with st.expander("Past campaigns"):
+    selected = dict(zip(FILTERS, (selected_country, platform, tone_of_voice, target_audience)))
+    show_past_runs({name: value for name, value in selected.items() if value != "None"})
+
+# Re-attach to this session's job, or the one in the URL after a refresh
+current_job = st.session_state.get("job_id") or st.query_params.get("job")
+if current_job:
+    st.session_state["job_id"] = current_job
+    show_job(current_job)
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from cache import TaskCache, hash_key
+from incremental import StageStore
+from resources import get_agents, get_tasks
+from pipeline import run_campaign, COUNTRIES, AUDIENCES, PLATFORMS, TONES
+from metrics import RunMetrics, write_prometheus
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+# Matrix axes and the campaign option each one fills in
+MATRIX_AXES = {
+    "countries": "country",
+    "platforms": "platform",
+    "tones": "tone",
+    "audiences": "audience",
+    "keywords": "keywords",
+    "image_styles": "image_style",
+}
+
+DEFAULT_MATRIX = {
+    "countries": COUNTRIES,
+    "platforms": PLATFORMS,
+    "tones": TONES,
+    "audiences": AUDIENCES,
+    "keywords": [""],
+    "image_styles": ["None"],
+}
+
+
+def load_matrix(spec_path=None, overrides=None):
+    matrix = dict(DEFAULT_MATRIX)
+    if spec_path:
+        with open(spec_path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        unknown = set(spec) - set(MATRIX_AXES)
+        if unknown:
+            raise ValueError(f"Unknown matrix axes in {spec_path}: {sorted(unknown)}")
+        matrix.update(spec)
+    for axis, values in (overrides or {}).items():
+        if values:
+            matrix[axis] = values
+    return matrix
+
+
+def expand_jobs(matrix):
+    axes = list(MATRIX_AXES)
+    for values in itertools.product(*(matrix[axis] for axis in axes)):
+        options = {MATRIX_AXES[axis]: value for axis, value in zip(axes, values)}
+        yield hash_key(options)[:16], options
+
+
+def completed_job_ids(output_path):
+    # Only successful jobs count as done, failed ones are retried on resume
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A run killed mid-write can leave a truncated last line
+                continue
+            if record.get("status") == "ok":
+                done.add(record["job_id"])
+    return done
+
+
+class ResultWriter:
+    def __init__(self, output_path):
+        self._lock = threading.Lock()
+        self._file = open(output_path, "a", encoding="utf-8")
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def run_job(job_id, options, agents, tasks, task_cache, stage_store, refresh=False, task_workers=2):
+    started = time.time()
+    record = {"job_id": job_id, "options": options}
+    run_metrics = RunMetrics(run_id=job_id, labels=options)
+    metrics_token = run_metrics.start()
+    try:
+        # Imported here so the CLI starts without loading crewai
+        from research_index import research_index
+        result = run_campaign(
+            agents,
+            tasks,
+            options,
+            runner=lambda task, context: task_cache.execute(task, context=context, refresh=refresh),
+            max_workers=task_workers,
+            stage_store=stage_store,
+            refresh=refresh,
+            research_index=research_index,
+        )
+        record.update(status="ok", **result)
+    except Exception as e:
+        logging.error(f"Batch job {job_id} failed: {e}")
+        record.update(status="error", error=str(e))
+    finally:
+        run_metrics.finish(metrics_token)
+    record.update(elapsed=round(time.time() - started, 3), finished_at=time.time(), metrics=run_metrics.summary())
+    return record
+
+
+def run_batch(matrix, output_path, workers=2, task_workers=2, refresh=False):
+    done = completed_job_ids(output_path)
+    jobs = [(job_id, options) for job_id, options in expand_jobs(matrix) if job_id not in done]
+    print(f"{len(done)} jobs already done, {len(jobs)} to run", file=sys.stderr)
+    if not jobs:
+        return 0
+
+    # Every job shares one set of product page extracts
+    from web_fetch import web_fetcher
+    from tasks import PRODUCT_URLS
+    web_fetcher.prefetch(PRODUCT_URLS)
+
+    tasks = get_tasks()
+    agents = get_agents()
+    task_cache = TaskCache()
+    stage_store = StageStore()
+    writer = ResultWriter(output_path)
+    failures = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(run_job, job_id, options, agents, tasks, task_cache, stage_store, refresh, task_workers)
+                for job_id, options in jobs
+            ]
+            for count, future in enumerate(as_completed(futures), start=1):
+                record = future.result()
+                writer.write(record)
+                failures += record["status"] != "ok"
+                print(f"[{count}/{len(jobs)}] {record['job_id']} {record['status']} in {record['elapsed']}s", file=sys.stderr)
+    finally:
+        writer.close()
+        write_prometheus()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate campaigns for a country x platform x tone x audience matrix.")
+    parser.add_argument("--spec", help="JSON file mapping matrix axes to lists of values")
+    parser.add_argument("--output", default="campaigns.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=2, help="Number of campaigns generated at once")
+    parser.add_argument("--task-workers", type=int, default=2, help="Concurrent tasks within one campaign")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached task results")
+    for axis in MATRIX_AXES:
+        parser.add_argument(f"--{axis.replace('_', '-')}", nargs="+", metavar="VALUE")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    matrix = load_matrix(args.spec, {axis: getattr(args, axis) for axis in MATRIX_AXES})
+    failures = run_batch(matrix, args.output, workers=args.workers, task_workers=args.task_workers, refresh=args.refresh)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tracemalloc
+import contextvars
+import itertools
+import tempfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep the benchmark fully offline
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from cache import execute_task
+from embeddings import HashingEmbedder
+from pipeline import run_campaign, COUNTRIES, PLATFORMS, TONES, AUDIENCES, IMAGE_STYLES
+from log_stream import LogStreamer
+from images import generate_images, ImageStore
+
+try:
+    from crewai.tools import BaseTool
+except ImportError:
+    from crewai_tools import BaseTool
+
+try:
+    from crewai.llms.base_llm import BaseLLM
+except ImportError:
+    # Older, langchain based crewai releases take a langchain chat model
+    BaseLLM = None
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+SEARCH_TOOL_NAME = "Search the internet with Serper"
+SCRAPE_TOOL_NAME = "Read website content"
+STUB_ACTION_INPUT = 'Action Input: {"search_query": "Australia Travel Safe'
+FILLER = "Australia Travel Safe keeps travellers informed with safety alerts, itineraries and local guides. "
+
+
+def filler(size, seed=""):
+    # Deterministic text of roughly `size` characters
+    text = f"{seed} " + FILLER * (size // len(FILLER) + 1)
+    return text[:max(size, 1)]
+
+
+def stub_reply(prompt, response_chars=1500, tool_calls=1):
+    # Answers in crewai's ReAct format: tool calls first (if configured),
+    # counted from the stub's own earlier actions in the conversation, then
+    # a final answer with three options.
+    made = prompt.count(STUB_ACTION_INPUT)
+    if made < tool_calls:
+        return f'Thought: I should research this first.\nAction: {SEARCH_TOOL_NAME}\n{STUB_ACTION_INPUT} {made + 1}"}}'
+    option_size = max(response_chars // 3, 20)
+    options = "\n\n".join(f"Option {n}: {filler(option_size, f'Option {n}')}" for n in range(1, 4))
+    return f"Thought: I now know the final answer\nFinal Answer: {options}"
+
+
+def _prompt_text(messages):
+    if isinstance(messages, str):
+        return messages
+    parts = []
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", message)
+        parts.append(str(content))
+    return "\n".join(parts)
+
+
+if BaseLLM is not None:
+    class StubLLM(BaseLLM):
+        latency: float = 0.05
+        response_chars: int = 1500
+        tool_calls: int = 1
+
+        def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None, response_model=None):
+            time.sleep(self.latency)
+            return stub_reply(_prompt_text(messages), self.response_chars, self.tool_calls)
+
+        def supports_function_calling(self):
+            return False
+
+    def make_stub_llm(latency, response_chars, tool_calls):
+        return StubLLM(model="stub-llm", latency=latency, response_chars=response_chars, tool_calls=tool_calls)
+else:
+    from langchain_core.language_models.chat_models import SimpleChatModel
+
+    class StubLLM(SimpleChatModel):
+        latency: float = 0.05
+        response_chars: int = 1500
+        tool_calls: int = 1
+        model_name: str = "stub-llm"
+
+        @property
+        def _llm_type(self):
+            return "stub"
+
+        def _call(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(self.latency)
+            return stub_reply(_prompt_text(messages), self.response_chars, self.tool_calls)
+
+    def make_stub_llm(latency, response_chars, tool_calls):
+        return StubLLM(latency=latency, response_chars=response_chars, tool_calls=tool_calls)
+
+
+class StubSearchTool(BaseTool):
+    name: str = SEARCH_TOOL_NAME
+    description: str = "Search the internet for a query (offline stand-in)."
+    latency: float = 0.02
+    response_chars: int = 2000
+
+    def _run(self, search_query: str = "") -> str:
+        time.sleep(self.latency)
+        return filler(self.response_chars, f"Results for {search_query}:")
+
+
+class StubScrapeTool(BaseTool):
+    name: str = SCRAPE_TOOL_NAME
+    description: str = "Read the content of a website (offline stand-in)."
+    latency: float = 0.02
+    response_chars: int = 4000
+
+    def _run(self, website_url: str = "") -> str:
+        time.sleep(self.latency)
+        return filler(self.response_chars, f"Content of {website_url}:")
+
+
+def stub_image_generator(latency, size=64 * 1024):
+    # Stands in for DALL-E; returns image bytes so nothing is downloaded
+    def generate(prompt):
+        time.sleep(latency)
+        return (prompt.encode("utf-8") * (size // max(len(prompt), 1) + 1))[:size]
+    return generate
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    # Nearest rank
+    index = max(math.ceil(pct / 100.0 * len(ordered)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def job_options(count, variants=1):
+    # Cycle through the option space so jobs differ like real traffic does
+    combos = itertools.cycle(itertools.product(COUNTRIES, PLATFORMS, TONES, AUDIENCES))
+    for _, (country, platform, tone, audience) in zip(range(count), combos):
+        yield {
+            "country": country,
+            "platform": platform,
+            "tone": tone,
+            "audience": audience,
+            "keywords": "safety, travel",
+            "image_style": IMAGE_STYLES[0],
+            "variants": variants,
+        }
+
+
+def run_level(agents, tasks, concurrency, jobs, task_workers=2, image_latency=0.1, measure_memory=True, variants=1):
+    latencies = []
+    errors = 0
+    generate = stub_image_generator(image_latency)
+
+    def one_job(options):
+        started = time.perf_counter()
+        # The deterministic local embedder keeps variant selection offline
+        result = run_campaign(agents, tasks, options, runner=execute_task, max_workers=task_workers, embedder=HashingEmbedder())
+        if result["image_description"]:
+            # A fresh store per job so every level pays for generation
+            with tempfile.TemporaryDirectory() as directory:
+                _, errors = generate_images(result["image_description"], options["image_style"], store=ImageStore(directory), generate=generate)
+            if errors:
+                raise RuntimeError(errors[0])
+        return time.perf_counter() - started
+
+    if measure_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, one_job, options) for options in job_options(jobs, variants)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                logging.error(f"Benchmark job failed: {e}")
+                errors += 1
+    wall = time.perf_counter() - started
+    peak = 0
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "concurrency": concurrency,
+        "jobs": jobs,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(len(latencies) / wall, 3) if wall else 0.0,
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p95_s": round(percentile(latencies, 95), 3),
+        "peak_memory_mb": round(peak / (1024 * 1024), 2),
+    }
+
+
+def find_regressions(results, baseline, tolerance):
+    previous = {row["concurrency"]: row for row in baseline.get("results", [])}
+    regressions = []
+    for row in results:
+        before = previous.get(row["concurrency"])
+        if not before:
+            continue
+        if before["p95_s"] and row["p95_s"] > before["p95_s"] * (1 + tolerance):
+            regressions.append(f"concurrency {row['concurrency']}: p95 {before['p95_s']}s -> {row['p95_s']}s")
+        if row["throughput_per_s"] < before["throughput_per_s"] * (1 - tolerance):
+            regressions.append(f"concurrency {row['concurrency']}: throughput {before['throughput_per_s']}/s -> {row['throughput_per_s']}/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the campaign pipeline offline with stub LLM, search, scrape and image backends.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4], help="Concurrent campaigns per level")
+    parser.add_argument("--jobs", type=int, default=8, help="Campaigns per concurrency level")
+    parser.add_argument("--task-workers", type=int, default=2, help="Concurrent tasks within one campaign")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per stub LLM call")
+    parser.add_argument("--tool-latency", type=float, default=0.02, help="Seconds per stub search/scrape call")
+    parser.add_argument("--image-latency", type=float, default=0.1, help="Seconds per stub image generation")
+    parser.add_argument("--response-chars", type=int, default=1500, help="Size of each stub LLM answer")
+    parser.add_argument("--tool-calls", type=int, default=1, help="Tool calls each agent makes before answering")
+    parser.add_argument("--variants", type=int, default=1, help="Ad copy candidates generated per job")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc, which slows the run down")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown against the baseline")
+    parser.add_argument("--max-p95", type=float, help="Fail if any level's p95 latency exceeds this many seconds")
+    args = parser.parse_args(argv)
+
+    from agents import MarketingAnalysisAgents
+    from tasks import MarketingAnalysisTasks
+
+    agents = MarketingAnalysisAgents(
+        llm=make_stub_llm(args.llm_latency, args.response_chars, args.tool_calls),
+        search_tool=StubSearchTool(latency=args.tool_latency),
+        scrape_tool=StubScrapeTool(latency=args.tool_latency),
+    )
+    tasks = MarketingAnalysisTasks()
+
+    # Verbose agent logs go to a detached buffer instead of the terminal
+    log_stream = LogStreamer()
+    log_token = log_stream.attach()
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            results.append(run_level(agents, tasks, concurrency, args.jobs, args.task_workers, args.image_latency, not args.no_memory, args.variants))
+    finally:
+        log_stream.detach(log_token)
+    report = {"config": vars(args), "results": results}
+
+    print(f"{'concurrency':>11} {'jobs':>5} {'errors':>6} {'jobs/s':>8} {'p50 s':>8} {'p95 s':>8} {'peak MB':>8}", file=sys.stderr)
+    for row in results:
+        print(f"{row['concurrency']:>11} {row['jobs']:>5} {row['errors']:>6} {row['throughput_per_s']:>8} {row['p50_s']:>8} {row['p95_s']:>8} {row['peak_memory_mb']:>8}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failures = [f"concurrency {row['concurrency']}: {row['errors']} failed jobs" for row in results if row["errors"]]
+    if args.max_p95 is not None:
+        failures += [f"concurrency {row['concurrency']}: p95 {row['p95_s']}s over {args.max_p95}s" for row in results if row["p95_s"] > args.max_p95]
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures += find_regressions(results, json.load(f), args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from metrics import annotate
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+CACHE_DIR = os.getenv("TASK_CACHE_DIR", os.path.join(".cache", "tasks"))
+CACHE_TTL = float(os.getenv("TASK_CACHE_TTL", 7 * 24 * 60 * 60))
+CACHE_MAX_BYTES = int(os.getenv("TASK_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+CACHE_MAX_ENTRIES = int(os.getenv("TASK_CACHE_MAX_ENTRIES", 500))
+
+
+def hash_key(*parts):
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def model_name_of(agent):
+    llm = getattr(agent, "llm", None)
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or str(llm)
+
+
+def execute_task(task, context=None):
+    # crewai >= 0.60 exposes execute_sync returning a TaskOutput, older
+    # releases only have execute returning the raw string.
+    if hasattr(task, "execute_sync"):
+        output = task.execute_sync(context=context)
+    else:
+        output = task.execute(context=context)
+    return str(getattr(output, "raw", output))
+
+
+class DiskCache:
+    # One JSON file per entry. The file mtime doubles as the LRU recency
+    # marker, so eviction survives restarts without a separate index.
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, max_entries=CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get_entry(self, key):
+        # The stored entry with its created_at and meta, or None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.error(f"Discarding unreadable cache entry {path}: {e}")
+            self.delete(key)
+            return None
+
+        if self.ttl and time.time() - entry.get("created_at", 0) > self.ttl:
+            self.delete(key)
+            return None
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        if entry is None:
+            return default
+        return entry.get("value", default)
+
+    def set(self, key, value, meta=None):
+        entry = {"key": key, "created_at": time.time(), "meta": meta or {}, "value": value}
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logging.error(f"Failed to write cache entry {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            now = time.time()
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            # Least recently used first
+            entries.sort()
+            while entries and (total > self.max_bytes or len(entries) > self.max_entries
+                               or (self.ttl and now - entries[0][0] > self.ttl)):
+                _, size, path = entries.pop(0)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+class TaskCache(DiskCache):
+    def key_for(self, task, context=None, model_name=None):
+        return hash_key(
+            task.description,
+            task.expected_output,
+            getattr(task.agent, "role", None),
+            model_name or model_name_of(task.agent),
+            context or "",
+        )
+
+    def execute(self, task, context=None, model_name=None, refresh=False, bypass=False):
+        # refresh skips the lookup but stores the new result, bypass does neither
+        key = self.key_for(task, context=context, model_name=model_name)
+        if not refresh and not bypass:
+            cached = self.get(key)
+            if cached is not None:
+                annotate(cached=True)
+                return cached
+
+        annotate(cached=False)
+        output = execute_task(task, context=context)
+        if not bypass:
+            self.set(key, output, meta={"role": getattr(task.agent, "role", None)})
+        return output
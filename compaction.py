@@ -0,0 +1,191 @@
+import os
+import re
+import threading
+import functools
+import logging
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+# Per-task savings are logged at INFO; set COMPACTION_LOG_LEVEL=INFO to see
+# them. Runs report them in token_savings either way.
+logger = logging.getLogger(__name__)
+logger.setLevel(os.getenv("COMPACTION_LOG_LEVEL", "ERROR"))
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+COPY_TOKEN_BUDGET = int(os.getenv("COPY_TOKEN_BUDGET", 400))
+
+# Start of an option in the ad copy output, either labelled ("Option 1:",
+# "**Ad Copy 2**") or, failing that, a plain numbered list ("3.")
+LABELLED_OPTION_RE = re.compile(
+    r"^[ \t>*#_-]*(?:option|ad copy|copy|variant)\s*#?\s*\d+", re.IGNORECASE | re.MULTILINE
+)
+NUMBERED_OPTION_RE = re.compile(r"^[ \t>*#_-]*\d+[.)]\s", re.MULTILINE)
+OPTION_LABEL_RE = re.compile(r"^[\s>*#_-]*(?:(?:option|ad copy|copy|photo(?:graph)?|image|variant)\s*#?\s*\d+|\d+[.)])[*_\s]*[:.\-–]?[*_\s]*", re.IGNORECASE)
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+TRUNCATION_MARK = "[...]"
+
+
+@functools.lru_cache(maxsize=8)
+def _encoding(model_name):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except Exception:
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            return None
+
+
+def count_tokens(text, model_name="gpt-4o-mini"):
+    if not text:
+        return 0
+    encoding = _encoding(model_name)
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def extract_ad_copies(text, limit=3):
+    text = str(text or "")
+    starts = []
+    for pattern in (LABELLED_OPTION_RE, NUMBERED_OPTION_RE):
+        starts = [match.start() for match in pattern.finditer(text)]
+        if len(starts) >= 2:
+            break
+    if len(starts) < 2:
+        return []
+    starts.append(len(text))
+    copies = [text[start:end].strip() for start, end in zip(starts, starts[1:])]
+    # Answers often close with commentary after the last option; it keeps
+    # no more paragraphs than the longest of the other options
+    paragraphs = max(len(PARAGRAPH_RE.split(copy)) for copy in copies[:-1])
+    copies[-1] = "\n\n".join(PARAGRAPH_RE.split(copies[-1])[:paragraphs])
+    return [copy for copy in copies if copy][:limit]
+
+
+def split_options(text, limit=3):
+    # The options of a multi-option answer without their labels, or the
+    # whole answer when it has no recognisable options
+    options = extract_ad_copies(text, limit=limit) or [str(text or "").strip()]
+    stripped_options = []
+    for option in options:
+        # Labels can be stacked, e.g. "1. **Option 1:**"
+        stripped = None
+        while stripped != option:
+            stripped, option = option, OPTION_LABEL_RE.sub("", option, count=1)
+        if option.strip():
+            stripped_options.append(option.strip())
+    return stripped_options
+
+
+def truncate(text, budget, model_name="gpt-4o-mini"):
+    # Keeps whole paragraphs (then whole sentences) from the top until the
+    # budget is spent; reports lead with their key findings.
+    kept = []
+    used = 0
+    for paragraph in PARAGRAPH_RE.split(text.strip()):
+        size = count_tokens(paragraph, model_name)
+        if used + size <= budget:
+            kept.append(paragraph)
+            used += size
+            continue
+        sentences = []
+        for sentence in SENTENCE_RE.split(paragraph):
+            size = count_tokens(sentence, model_name)
+            if used + size > budget:
+                break
+            sentences.append(sentence)
+            used += size
+        if sentences:
+            kept.append(" ".join(sentences))
+        break
+    kept.append(TRUNCATION_MARK)
+    return "\n\n".join(kept)
+
+
+class Compactor:
+    def __init__(self, context_budget=CONTEXT_TOKEN_BUDGET, copy_budget=COPY_TOKEN_BUDGET, model_name="gpt-4o-mini"):
+        self.context_budget = context_budget
+        self.copy_budget = copy_budget
+        self.model_name = model_name
+        self.savings = []
+        self.prompt_tokens = {}
+        self._lock = threading.Lock()
+
+    def _record(self, name, before, after):
+        saved = before - after
+        with self._lock:
+            self.savings.append({"task": name, "tokens_before": before, "tokens_after": after, "tokens_saved": saved})
+        logger.info(f"{name}: {before} -> {after} tokens ({saved} saved)")
+
+    def compact(self, text, budget, name="context"):
+        if not text or not budget:
+            return text
+        before = count_tokens(text, self.model_name)
+        if before <= budget:
+            self._record(name, before, before)
+            return text
+        compacted = truncate(text, budget, self.model_name)
+        self._record(name, before, count_tokens(compacted, self.model_name))
+        return compacted
+
+    def split_budget(self, sizes):
+        # Water-filling: outputs under an equal share keep their full size
+        # and the budget they leave unused goes to the larger ones, so one
+        # long report cannot crowd out the others.
+        shares = [0] * len(sizes)
+        remaining = self.context_budget
+        left = sorted(range(len(sizes)), key=lambda index: sizes[index])
+        while left:
+            share = remaining // len(left)
+            index = left[0]
+            if sizes[index] > share:
+                for larger in left:
+                    shares[larger] = share
+                break
+            shares[index] = sizes[index]
+            remaining -= sizes[index]
+            left.pop(0)
+        return shares
+
+    def context(self, name, task, parts):
+        # Each upstream output is compacted to its own share of the budget
+        context = None
+        if parts:
+            if self.context_budget:
+                sizes = [count_tokens(part, self.model_name) for part in parts]
+                budgets = self.split_budget(sizes)
+                parts = [
+                    part if size <= budget else truncate(part, budget, self.model_name)
+                    for part, size, budget in zip(parts, sizes, budgets)
+                ]
+                context = "\n\n".join(parts)
+                self._record(name, sum(sizes), count_tokens(context, self.model_name))
+            else:
+                context = "\n\n".join(parts)
+        with self._lock:
+            self.prompt_tokens[name] = count_tokens(task.description, self.model_name) + count_tokens(context, self.model_name)
+        return context
+
+    def ad_copies(self, text, name="ad_copy"):
+        # The photographer only needs the copies themselves, not the
+        # reasoning and strategy recap around them.
+        copies = extract_ad_copies(text)
+        if not copies:
+            return self.compact(text, self.copy_budget, name=name)
+        before = count_tokens(str(text), self.model_name)
+        compacted = "\n\n".join(copies)
+        if count_tokens(compacted, self.model_name) > self.copy_budget:
+            compacted = truncate(compacted, self.copy_budget, self.model_name)
+        self._record(name, before, count_tokens(compacted, self.model_name))
+        return compacted
+
+    def total_saved(self):
+        with self._lock:
+            return sum(item["tokens_saved"] for item in self.savings)
@@ -0,0 +1,76 @@
+import os
+import re
+import hashlib
+import numpy as np
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "local")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", 512))
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def cosine_similarity_matrix(vectors):
+    unit = normalize_rows(vectors)
+    return unit @ unit.T
+
+
+class HashingEmbedder:
+    # Signed feature hashing of words and word pairs. Deterministic and
+    # offline, so results are reproducible in tests and benchmarks; it
+    # measures wording overlap rather than meaning.
+    def __init__(self, dim=LOCAL_EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"local-{dim}"
+
+    def _features(self, text):
+        words = WORD_RE.findall(str(text).lower())
+        return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    def embed(self, texts):
+        rows, columns, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                rows.append(row)
+                columns.append(digest % self.dim)
+                signs.append(1.0 if digest >> 63 else -1.0)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)), np.asarray(signs, dtype=np.float32))
+        return normalize_rows(vectors)
+
+
+class OpenAIEmbedder:
+    # One batched request per call, through the shared OpenAI rate limiter
+    def __init__(self, model=EMBEDDING_MODEL, openai_api_key=None):
+        from langchain_openai import OpenAIEmbeddings
+        kwargs = {"openai_api_key": openai_api_key} if openai_api_key else {}
+        self.client = OpenAIEmbeddings(model=model, **kwargs)
+        self.name = model
+
+    def embed(self, texts):
+        from ratelimit import limiter
+        from compaction import count_tokens
+        texts = [str(text) for text in texts]
+        tokens = sum(count_tokens(text) for text in texts)
+        vectors = limiter("openai").call(lambda: self.client.embed_documents(texts), tokens=tokens)
+        return normalize_rows(vectors)
+
+
+EMBEDDERS = {
+    "local": HashingEmbedder,
+    "openai": OpenAIEmbedder,
+}
+
+
+def get_embedder(backend=None, **kwargs):
+    backend = backend or EMBEDDING_BACKEND
+    if backend not in EMBEDDERS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {', '.join(EMBEDDERS)}")
+    return EMBEDDERS[backend](**kwargs)
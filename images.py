@@ -0,0 +1,130 @@
+import os
+import re
+import threading
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from cache import hash_key
+from compaction import split_options
+from metrics import span, annotate
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+IMAGE_DIR = os.getenv("IMAGE_DIR", os.path.join(".cache", "images"))
+IMAGE_MODEL = os.getenv("IMAGE_MODEL", "dall-e-2")
+# DALL-E 2 rejects prompts longer than 1000 characters
+MAX_PROMPT_CHARS = int(os.getenv("IMAGE_MAX_PROMPT_CHARS", 1000))
+MIN_PROMPT_CHARS = 20
+
+AGENT_NOISE_RE = re.compile(r"^(?:thought|final answer|action)\s*:", re.IGNORECASE | re.MULTILINE)
+
+_session = requests.Session()
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+
+def parse_descriptions(review_output, limit=3):
+    # The review task returns three numbered photo options
+    return split_options(review_output, limit=limit)
+
+
+def is_usable(description):
+    # Descriptions that are already a clean, short paragraph go straight to
+    # the image model without another LLM rewrite.
+    return MIN_PROMPT_CHARS <= len(description) <= MAX_PROMPT_CHARS and not AGENT_NOISE_RE.search(description)
+
+
+def rewrite_description(llm, description):
+    from langchain.prompts import PromptTemplate
+    from langchain.chains import LLMChain
+
+    prompt_template = PromptTemplate(
+        input_variables=["image_desc"],
+        template=f"Rewrite the following photo description as a single image generation prompt under {MAX_PROMPT_CHARS} characters: {{image_desc}}"
+    )
+    chain = LLMChain(llm=llm, prompt=prompt_template)
+    return chain.run(description)[:MAX_PROMPT_CHARS]
+
+
+def dalle_generate(prompt):
+    from langchain_community.utilities.dalle_image_generator import DallEAPIWrapper
+    return DallEAPIWrapper(model_name=IMAGE_MODEL).run(prompt)
+
+
+class ImageStore:
+    # Images are stored under a hash of description, style and model, so the
+    # same request is served from disk instead of the image API.
+    def __init__(self, directory=IMAGE_DIR):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key_for(self, description, style, model=IMAGE_MODEL):
+        return hash_key(description, style, model)[:32]
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        path = self.path_for(key)
+        return path if os.path.exists(path) else None
+
+    def put(self, key, data):
+        path = self.path_for(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+
+def styled_prompt(description, style):
+    if not style or style == "None" or style.lower() in description.lower():
+        return description
+    return f"{description} {style} style."[:MAX_PROMPT_CHARS]
+
+
+def generate_image(description, style, store, llm=None, generate=dalle_generate):
+    with span("image", "generate"):
+        # Keyed on the reviewed description, so a hit also skips the rewrite
+        key = store.key_for(description, style)
+        path = store.get(key)
+        annotate(cached=path is not None)
+        if path is None:
+            prompt = description
+            if not is_usable(description) and llm is not None:
+                annotate(rewritten=True)
+                prompt = rewrite_description(llm, description)
+            result = generate(styled_prompt(prompt[:MAX_PROMPT_CHARS], style))
+            if isinstance(result, bytes):
+                data = result
+            else:
+                response = _session.get(result, timeout=60)
+                response.raise_for_status()
+                data = response.content
+            path = store.put(key, data)
+        return {"description": description, "path": path}
+
+
+def generate_images(review_output, style, llm=None, store=None, max_workers=3, generate=dalle_generate):
+    # Returns the generated images and a message for every option that failed
+    store = store or ImageStore()
+    descriptions = parse_descriptions(review_output)
+    if not descriptions:
+        return [], []
+
+    # Images are independent, so every option is generated at once
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, generate_image, description, style, store, llm, generate)
+            for description in descriptions
+        ]
+        images = []
+        errors = []
+        for future in futures:
+            try:
+                images.append(future.result())
+            except Exception as e:
+                logging.error(f"Failed to generate image: {e}")
+                errors.append(f"Failed to generate image: {e}")
+        return images, errors
@@ -0,0 +1,50 @@
+import os
+from cache import DiskCache, hash_key, CACHE_TTL
+
+STAGE_DIR = os.getenv("STAGE_CACHE_DIR", os.path.join(".cache", "stages"))
+
+REUSED = "reused"
+RECOMPUTED = "recomputed"
+
+
+class StageStore(DiskCache):
+    def __init__(self, directory=STAGE_DIR, ttl=CACHE_TTL, **kwargs):
+        super().__init__(directory=directory, ttl=ttl, **kwargs)
+
+
+def plan_stages(stages, task_names, options, settings, store, refresh=False, prompts=None):
+    # A stage's fingerprint covers its own inputs and task prompts, the
+    # models and budgets in settings, plus the fingerprint of the stage
+    # before it, so changing e.g. only the image style keeps analysis and
+    # campaign outputs. Once one stage is recomputed, every stage after it
+    # is recomputed too, since its upstream output may have changed.
+    prompts = prompts or {}
+    completed = {}
+    plan = []
+    upstream = ""
+    invalidated = refresh
+    for stage, stage_tasks, inputs in stages:
+        present = [name for name in stage_tasks if name in task_names]
+        if not present:
+            continue
+        fingerprint = hash_key(
+            stage, {key: options.get(key) for key in inputs}, upstream, settings,
+            {name: prompts.get(name) for name in present},
+        )
+        upstream = fingerprint
+
+        stored = None if invalidated else store.get(fingerprint)
+        if stored is not None and all(name in stored for name in present):
+            completed.update({name: stored[name] for name in present})
+            status = REUSED
+        else:
+            invalidated = True
+            status = RECOMPUTED
+        plan.append({"stage": stage, "status": status, "fingerprint": fingerprint, "tasks": present})
+    return completed, plan
+
+
+def save_stages(plan, outputs, store):
+    for stage in plan:
+        if stage["status"] == RECOMPUTED:
+            store.set(stage["fingerprint"], {name: outputs[name] for name in stage["tasks"]}, meta={"stage": stage["stage"]})
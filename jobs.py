@@ -0,0 +1,149 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from cache import hash_key
+from log_stream import LogStreamer
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+JOB_DIR = os.getenv("JOB_DIR", ".jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+
+class Job:
+    def __init__(self, job_id, options):
+        self.id = job_id
+        self.options = options
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.events = []
+        self.result = None
+        self.error = None
+        # Captures the verbose crew output of this job only
+        self.log = LogStreamer()
+        # Set by streaming jobs to expose partial task output while running
+        self.streams = None
+        self._lock = threading.Lock()
+        self.on_change = None
+
+    def progress(self, message):
+        with self._lock:
+            self.events.append({"time": time.time(), "message": message})
+        if self.on_change:
+            self.on_change(self)
+
+    def to_dict(self, log=True):
+        with self._lock:
+            return {
+                "id": self.id,
+                "options": self.options,
+                "status": self.status,
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+                "events": list(self.events),
+                "result": self.result,
+                "error": self.error,
+                "log": self.log.text() if log else "",
+                "sections": self.streams.snapshot() if self.streams else {},
+            }
+
+
+class JobManager:
+    # Runs generation jobs on a bounded pool outside the Streamlit script
+    # thread. Job state is written to disk on every change, so a reconnecting
+    # session can re-attach to a running or finished job by its ID.
+    def __init__(self, directory=JOB_DIR, max_workers=JOB_WORKERS):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _persist(self, job):
+        # Progress events rewrite the state file, so the log (up to 64 KB)
+        # is only written once the job has finished
+        path = self._path(job.id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job.to_dict(log=job.finished is not None), f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logging.error(f"Failed to persist job {job.id}: {e}")
+
+    def submit(self, options, work, *args):
+        # Identical options that are already queued or running share one job
+        key = hash_key(options, *args)
+        with self._lock:
+            job_id = self._active.get(key)
+            if job_id:
+                return job_id
+            job = Job(uuid.uuid4().hex, options)
+            job.on_change = self._persist
+            self._jobs[job.id] = job
+            self._active[key] = job.id
+        self._persist(job)
+        self._executor.submit(self._run, key, job, work, args)
+        return job.id
+
+    def _run(self, key, job, work, args):
+        job.status = RUNNING
+        job.started = time.time()
+        self._persist(job)
+        log_token = job.log.attach()
+        try:
+            job.result = work(job, *args)
+            job.status = DONE
+        except Exception as e:
+            logging.error(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.log.detach(log_token)
+            job.finished = time.time()
+            self._persist(job)
+            with self._lock:
+                self._active.pop(key, None)
+                # Finished jobs are served from disk from now on
+                self._jobs.pop(job.id, None)
+
+    def get(self, job_id):
+        if not job_id or not JOB_ID_RE.fullmatch(job_id):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job:
+            return job.to_dict()
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Not in memory but never finished: the process running it is gone
+        if state["status"] in (QUEUED, RUNNING):
+            state["status"] = INTERRUPTED
+        return state
+
+
+# One pool per process, shared by every session
+job_manager = JobManager()
@@ -0,0 +1,79 @@
+import re
+import sys
+import threading
+import contextvars
+from collections import deque
+
+ANSI_RE = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
+
+# The log stream of the session that is currently running, if any
+_current_stream = contextvars.ContextVar("log_stream", default=None)
+_install_lock = threading.Lock()
+
+
+class RoutedStdout:
+    # Installed once as sys.stdout. Writes go to the stream bound to the
+    # current context, so concurrent sessions never see each other's logs.
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def write(self, data):
+        stream = _current_stream.get()
+        if stream is None:
+            return self.fallback.write(data)
+        return stream.write(data)
+
+    def flush(self):
+        stream = _current_stream.get()
+        if stream is None:
+            return self.fallback.flush()
+        return stream.flush()
+
+    def isatty(self):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+
+def install():
+    with _install_lock:
+        if not isinstance(sys.stdout, RoutedStdout):
+            sys.stdout = RoutedStdout(sys.stdout)
+
+
+class LogStreamer:
+    # Ring buffer bounded by a byte budget. Pages poll text() for the log of
+    # a job, so writers never touch Streamlit themselves.
+    def __init__(self, max_bytes=64 * 1024):
+        self.max_bytes = max_bytes
+        self._chunks = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        cleaned = ANSI_RE.sub("", data)
+        if not cleaned:
+            return len(data)
+        size = len(cleaned.encode("utf-8"))
+        with self._lock:
+            self._chunks.append((cleaned, size))
+            self._size += size
+            while self._size > self.max_bytes and len(self._chunks) > 1:
+                _, dropped = self._chunks.popleft()
+                self._size -= dropped
+        return len(data)
+
+    def text(self):
+        with self._lock:
+            return "".join(chunk for chunk, _ in self._chunks)
+
+    def flush(self):
+        pass
+
+    def attach(self):
+        install()
+        return _current_stream.set(self)
+
+    def detach(self, token):
+        _current_stream.reset(token)
@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+METRICS_DIR = os.getenv("METRICS_DIR", ".metrics")
+METRIC_PREFIX = "tourism_content"
+
+# The run being measured and the innermost open span in this context. The
+# scheduler copies contexts onto its workers, so spans opened there nest
+# under the right run.
+_current_run = contextvars.ContextVar("metrics_run", default=None)
+_current_span = contextvars.ContextVar("metrics_span", default=None)
+
+COUNTERS = ("llm_calls", "prompt_tokens", "completion_tokens", "retries")
+
+
+class Registry:
+    # Process-wide aggregates across runs, exported in Prometheus text format
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._summaries = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            total, count = self._summaries.get(key, (0.0, 0))
+            self._summaries[key] = (total + value, count + 1)
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def text(self):
+        def fmt(labels):
+            if not labels:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in labels)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            summaries = sorted(self._summaries.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+        for name in sorted({name for (name, _), _ in summaries}):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} summary")
+            for (metric, labels), (total, count) in summaries:
+                if metric == name:
+                    lines.append(f"{METRIC_PREFIX}_{name}_sum{fmt(labels)} {total:.6f}")
+                    lines.append(f"{METRIC_PREFIX}_{name}_count{fmt(labels)} {count}")
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+            for (metric, labels), value in counters:
+                if metric == name:
+                    lines.append(f"{METRIC_PREFIX}_{name}{fmt(labels)} {value}")
+        for name in sorted({name for (name, _), _ in gauges}):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            for (metric, labels), value in gauges:
+                if metric == name:
+                    lines.append(f"{METRIC_PREFIX}_{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class RunMetrics:
+    def __init__(self, run_id=None, labels=None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.labels = labels or {}
+        self.spans = []
+        self.totals = {name: 0 for name in COUNTERS}
+        self.started = None
+        self.duration = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        return _current_run.set(self)
+
+    def finish(self, token):
+        self.duration = time.perf_counter() - self._t0
+        _current_run.reset(token)
+        for span in self.spans:
+            REGISTRY.observe(f"{span['kind']}_duration_seconds", {span["kind"]: span["name"]}, span["duration"])
+        for name, value in self.totals.items():
+            REGISTRY.inc(f"{name}_total", {}, value)
+        REGISTRY.observe("run_duration_seconds", {}, self.duration)
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def count(self, name, value=1):
+        # COUNTERS are always reported; modules may count anything else too
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0) + value
+
+    def summary(self):
+        # One row per task, agent, tool and image step, slowest first
+        rows = {}
+
+        def row(kind, name):
+            return rows.setdefault((kind, name), {
+                "kind": kind, "name": name, "calls": 0, "total_s": 0.0, "max_s": 0.0,
+                **{counter: 0 for counter in COUNTERS},
+            })
+
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            targets = [row(span["kind"], span["name"])]
+            if span["kind"] == "task" and span.get("agent"):
+                targets.append(row("agent", span["agent"]))
+            for target in targets:
+                target["calls"] += 1
+                target["total_s"] = round(target["total_s"] + span["duration"], 3)
+                target["max_s"] = round(max(target["max_s"], span["duration"]), 3)
+                for counter in COUNTERS:
+                    target[counter] += span[counter]
+        return sorted(rows.values(), key=lambda item: item["total_s"], reverse=True)
+
+    def cache_stats(self):
+        # Tool cache outcomes of this run alone, from the spans' annotations
+        names = {"memory": "hits", "disk": "disk_hits", "miss": "misses", "coalesced": "coalesced"}
+        stats = dict.fromkeys(names.values(), 0)
+        with self._lock:
+            for span in self.spans:
+                name = names.get(span.get("cache"))
+                if name:
+                    stats[name] += 1
+        return stats
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "labels": self.labels,
+                "started": self.started,
+                "duration": self.duration,
+                "totals": dict(self.totals),
+                "spans": sorted(self.spans, key=lambda span: span["start"]),
+            }
+
+    def write_trace(self, directory=METRICS_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"run-{self.run_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+        return path
+
+
+def current_run():
+    return _current_run.get()
+
+
+@contextmanager
+def span(kind, name, **attrs):
+    run = _current_run.get()
+    if run is None:
+        yield None
+        return
+    parent = _current_span.get()
+    record = {
+        "kind": kind,
+        "name": name,
+        "parent": parent["name"] if parent else None,
+        "start": time.time(),
+        "status": "ok",
+        **{counter: 0 for counter in COUNTERS},
+        **attrs,
+    }
+    token = _current_span.set(record)
+    t0 = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+        raise
+    finally:
+        record["duration"] = round(time.perf_counter() - t0, 6)
+        _current_span.reset(token)
+        run.add(record)
+
+
+def annotate(**attrs):
+    record = _current_span.get()
+    if record is not None:
+        record.update(attrs)
+
+
+def count(name, value=1):
+    record = _current_span.get()
+    if record is not None:
+        record[name] = record.get(name, 0) + value
+    run = _current_run.get()
+    if run is not None:
+        run.count(name, value)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    # Attributes LLM round trips and token usage to the open span
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        count("llm_calls")
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        count("llm_calls")
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        if not usage:
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens += metadata.get("input_tokens", 0)
+                    completion_tokens += metadata.get("output_tokens", 0)
+        count("prompt_tokens", prompt_tokens)
+        count("completion_tokens", completion_tokens)
+
+    def on_retry(self, retry_state, **kwargs):
+        count("retries")
+
+
+def write_prometheus(path=None):
+    path = path or os.path.join(METRICS_DIR, "metrics.prom")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.text())
+    # Atomic so a textfile collector never reads a partial file
+    os.replace(tmp_path, path)
+    return path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = REGISTRY.text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server_lock = threading.Lock()
+_server = None
+
+
+def serve_prometheus(port):
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("", port), _MetricsHandler)
+            except OSError as e:
+                logging.error(f"Failed to start metrics endpoint on port {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
@@ -0,0 +1,47 @@
+from langchain_openai import ChatOpenAI
+from cache import hash_key
+from compaction import count_tokens
+from ratelimit import limiter
+
+
+class RateLimitedChatOpenAI(ChatOpenAI):
+    # Every completion goes through the process-wide OpenAI limiter. The
+    # client's own retries are turned off by chat_openai() so that backoff is
+    # coordinated across sessions instead of each client retrying on its own.
+
+    def _tokens(self, prompt):
+        # Prompt tokens plus the completion allowance count against the TPM budget
+        return count_tokens("".join(str(content) for _, content in prompt), self.model_name) + (self.max_tokens or 0)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = [(message.type, message.content) for message in messages]
+        key = hash_key(self.model_name, self.temperature, prompt, stop, kwargs)
+        generate = super()._generate
+        return limiter("openai").call(
+            lambda: generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=self._tokens(prompt),
+            key=key,
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # With streaming on, langchain calls this instead of _generate. The
+        # request is sent when the first chunk is pulled, so that is what
+        # goes through the limiter and is retried; once chunks have been
+        # handed out the stream cannot be restarted. Streams are not shared.
+        prompt = [(message.type, message.content) for message in messages]
+        stream = super()._stream
+
+        def first_chunk():
+            chunks = stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return chunks, next(chunks, None)
+
+        chunks, head = limiter("openai").call(first_chunk, tokens=self._tokens(prompt))
+        if head is None:
+            return
+        yield head
+        yield from chunks
+
+
+def chat_openai(**kwargs):
+    kwargs.setdefault("max_retries", 0)
+    return RateLimitedChatOpenAI(**kwargs)
@@ -0,0 +1,189 @@
+import logging
+from scheduler import TaskGraph, current_task
+from compaction import Compactor
+from metrics import span
+from incremental import plan_stages, save_stages
+from streaming import task_started, task_finished
+from variants import fan_out_ad_copy, MAX_VARIANTS
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+# Options offered in the sidebar and expanded by the batch generator
+COUNTRIES = ["Australia", "USA", "Canada", "UK", "India", "Germany"]  # Add more countries as needed
+AUDIENCES = ["Teens", "Adults", "Professionals"]
+PLATFORMS = ["Instagram", "Facebook", "Twitter", "LinkedIn"]
+TONES = ["Formal", "Casual", "Humorous", "Inspirational"]
+IMAGE_STYLES = ["Minimalist", "Vintage", "Modern", "Artistic"]
+
+# Pipeline stages, their tasks and the options each stage reads
+STAGES = [
+    ("analysis", ("product_analysis", "competitor_analysis"), ("country",)),
+    ("campaign", ("campaign_development", "instagram_ad_copy"), ("country", "platform", "tone", "audience", "keywords", "variants")),
+    ("image", ("take_photograph_task", "review_photo"), ("country", "image_style")),
+]
+
+# Task outputs added to the research index after they are computed
+RESEARCH_TASKS = ("product_analysis", "competitor_analysis")
+
+DEFAULT_OPTIONS = {
+    "country": "None",
+    "platform": "None",
+    "tone": "None",
+    "audience": "None",
+    "keywords": "",
+    "image_style": "None",
+    # Ad copy candidates generated in parallel; 1 asks a single agent call
+    "variants": 1,
+}
+
+
+def build_pipeline(agents, tasks, options, compactor=None):
+    # Returns the task graph, the node whose output is the ad copy and the
+    # rendered prompt of every node, for the stage fingerprints
+    options = {**DEFAULT_OPTIONS, **options}
+    country = options["country"]
+    graph = TaskGraph()
+    prompts = {}
+
+    def depends(name, fallback=None):
+        # Only wire up dependencies that were selected for this run
+        deps = [dep for dep in tasks.dependencies[name] if dep in graph.nodes]
+        return deps or ([fallback] if fallback else [])
+
+    def add(name, agent_name, make, deps, use_context=True):
+        # Agents are checked out of the pool when a task is built and
+        # returned once it has run, see run_campaign. The prompt is also
+        # rendered once without an agent or upstream output, so a changed
+        # template invalidates the stored stage.
+        graph.add(name, lambda up: make(agents.acquire(agent_name), up), deps, use_context=use_context)
+        task = make(None, None)
+        prompts[name] = [task.description, task.expected_output]
+
+    # The last copy task feeds the image stage, as the copy crew output did
+    copy_node = None
+    if country != "None":
+        add("product_analysis", "product_competitor_agent",
+            lambda agent, up: tasks.product_analysis(agent, country),
+            depends("product_analysis"))
+        add("competitor_analysis", "product_competitor_agent",
+            lambda agent, up: tasks.competitor_analysis(agent, country),
+            depends("competitor_analysis"))
+        copy_node = "competitor_analysis"
+
+    if options["platform"] != "None" and options["tone"] != "None" and options["audience"] != "None":
+        add("campaign_development", "strategy_planner_agent",
+            lambda agent, up: tasks.campaign_development(agent, platform=options["platform"], tone=options["tone"], audience=options["audience"], country=country),
+            depends("campaign_development"))
+        add("instagram_ad_copy", "creative_content_creator_agent",
+            lambda agent, up: tasks.instagram_ad_copy(agent, keywords=options["keywords"], country=country),
+            depends("instagram_ad_copy"))
+        copy_node = "instagram_ad_copy"
+
+    def copies(up):
+        # The photographer only gets the copies; the upstream output itself
+        # is covered by the previous stage's fingerprint
+        if up is None:
+            return "{ad copy}"
+        return compactor.ad_copies(up[copy_node], name="take_photograph_task") if compactor else up[copy_node]
+
+    if options["image_style"] != "None" and copy_node:
+        add("take_photograph_task", "senior_photographer_agent",
+            lambda agent, up: tasks.take_photograph_task(agent, copies(up), style=options["image_style"], country=country),
+            depends("take_photograph_task", copy_node),
+            use_context=False)
+        add("review_photo", "chief_creative_director_agent",
+            lambda agent, up: tasks.review_photo(agent, country=country),
+            depends("review_photo"))
+
+    return graph, copy_node, prompts
+
+
+def route_models(agents):
+    # Preferred and alternate model of each routed agent factory
+    routes = getattr(agents, "routes", None) or {}
+    return {name: [route.model_name, route.fallback] for name, route in sorted(routes.items())}
+
+
+def run_campaign(agents, tasks, options, runner, max_workers=4, initializer=None, compactor=None, on_progress=None,
+                 stage_store=None, refresh=False, embedder=None, research_index=None):
+    # Upstream outputs are condensed to a token budget before they reach the
+    # next prompt; pass Compactor(context_budget=0) to disable it.
+    model_name = getattr(agents.llm, "model_name", None) or getattr(agents.llm, "model", "gpt-4o-mini")
+    compactor = compactor or Compactor(model_name=model_name)
+    graph, copy_node, prompts = build_pipeline(agents, tasks, options, compactor=compactor)
+
+    # With a stage store, stages whose inputs are unchanged are not re-run
+    completed, stages = {}, []
+    if stage_store is not None:
+        # Stored outputs are only valid for the models and context budgets
+        # that produced them
+        settings = {
+            "default": model_name,
+            "routes": route_models(agents),
+            "context_budget": compactor.context_budget,
+            "copy_budget": compactor.copy_budget,
+        }
+        completed, stages = plan_stages(STAGES, graph.nodes, options, settings, stage_store, refresh=refresh, prompts=prompts)
+        if on_progress:
+            for stage in stages:
+                on_progress(f"{stage['stage']} stage {stage['status']}")
+
+    options = {**DEFAULT_OPTIONS, **options}
+    variants = max(1, min(int(options["variants"]), MAX_VARIANTS))
+    # Imported here rather than with the module, since it loads crewai
+    from research_index import current_country
+
+    def run_copy_variants(task, context):
+        # The graph's task is the first candidate; the others get their own
+        # pooled agents, returned once every candidate has run
+        extra = [
+            tasks.instagram_ad_copy(agents.acquire("creative_content_creator_agent"), keywords=options["keywords"], country=options["country"])
+            for _ in range(variants - 1)
+        ]
+        try:
+            return fan_out_ad_copy([task, *extra], runner, context, embedder=embedder)
+        finally:
+            for extra_task in extra:
+                agents.release(extra_task.agent)
+
+    def run(task, context):
+        name = current_task.get()
+        if on_progress:
+            on_progress(f"{name} started")
+        task_started(name)
+        # Each task runs in its own copied context, so this does not leak
+        current_country.set(options["country"])
+        try:
+            with span("task", name, agent=getattr(task.agent, "role", None)):
+                if name == "instagram_ad_copy" and variants > 1:
+                    output = run_copy_variants(task, context)
+                else:
+                    output = runner(task, context)
+        finally:
+            agents.release(task.agent)
+        task_finished(name, output)
+        if on_progress:
+            on_progress(f"{name} finished")
+        return output
+
+    outputs = {}
+    if graph.nodes:
+        outputs = graph.run(run, max_workers=max_workers, initializer=initializer, completed=completed, prepare_context=compactor.context)
+    if stage_store is not None:
+        save_stages(stages, outputs, stage_store)
+    if research_index is not None:
+        for name in RESEARCH_TASKS:
+            if name in outputs and name not in completed:
+                try:
+                    research_index.add(outputs[name], source=f"{name} ({options['country']})", country=options["country"])
+                except Exception as e:
+                    logging.error(f"Failed to index {name}: {e}")
+    return {
+        "outputs": outputs,
+        "stages": stages,
+        "token_savings": compactor.savings,
+        "prompt_tokens": compactor.prompt_tokens,
+        "ad_copy": outputs.get(copy_node),
+        "image_description": outputs.get("review_photo"),
+    }
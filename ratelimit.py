@@ -0,0 +1,195 @@
+import os
+import time
+import random
+import threading
+import logging
+from email.utils import parsedate_to_datetime
+from tool_cache import SingleFlight
+from metrics import REGISTRY, count
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", 5))
+BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", 1.0))
+BACKOFF_MAX = float(os.getenv("RATE_LIMIT_BACKOFF_MAX", 60.0))
+
+# Requests and tokens per minute per provider; None disables that bucket
+PROVIDER_LIMITS = {
+    "openai": {
+        "rpm": int(os.getenv("OPENAI_RPM", 500)),
+        "tpm": int(os.getenv("OPENAI_TPM", 200000)),
+    },
+    "serper": {
+        "rpm": int(os.getenv("SERPER_RPM", 300)),
+        "tpm": None,
+    },
+}
+
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+# Seconds each thread has spent throttled or backing off, so callers timing
+# a request can tell provider latency from local queueing
+_waits = threading.local()
+
+
+def waited():
+    return getattr(_waits, "seconds", 0.0)
+
+
+def _add_wait(seconds):
+    _waits.seconds = waited() + seconds
+
+
+class TokenBucket:
+    # Reservations may drive the balance negative; each caller then sleeps
+    # for its share of the deficit, so waiters are served in arrival order
+    # without polling.
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+
+def status_of(error):
+    # openai and requests errors both carry the HTTP response
+    response = getattr(error, "response", None)
+    return getattr(error, "status_code", None) or getattr(response, "status_code", None)
+
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    status = status_of(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # No response at all: timeouts and dropped connections
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    # Full jitter keeps concurrent callers from retrying in lockstep
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+class RateLimiter:
+    # One per provider and process, shared by every session. Calls wait for
+    # request and token budget, retry transient failures with backoff, and
+    # identical concurrent calls (same key) are made once.
+    def __init__(self, name, rpm, tpm=None, max_retries=MAX_RETRIES):
+        self.name = name
+        self.max_retries = max_retries
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._blocked_until = 0.0
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._labels = {"provider": name}
+
+    def _queue(self, delta):
+        with self._lock:
+            self._waiting += delta
+            waiting = self._waiting
+        REGISTRY.set("rate_limit_queue_depth", self._labels, waiting)
+
+    def queue_depth(self):
+        with self._lock:
+            return self._waiting
+
+    def acquire(self, tokens=0):
+        wait = self.requests.reserve(1)
+        if tokens and self.tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        with self._lock:
+            wait = max(wait, self._blocked_until - time.monotonic())
+        if wait <= 0:
+            return 0.0
+        REGISTRY.inc("rate_limit_throttled_total", self._labels)
+        REGISTRY.observe("rate_limit_wait_seconds", self._labels, wait)
+        count("throttled")
+        count("throttle_wait_s", round(wait, 3))
+        self._queue(1)
+        try:
+            time.sleep(wait)
+        finally:
+            self._queue(-1)
+            _add_wait(wait)
+        return wait
+
+    def pause(self, seconds):
+        # A 429 means the provider's window is exhausted for everyone
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def _call(self, fn, tokens):
+        for attempt in range(self.max_retries + 1):
+            self.acquire(tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_after(e)
+                if delay is None:
+                    delay = backoff_delay(attempt)
+                if status_of(e) == 429:
+                    self.pause(delay)
+                else:
+                    time.sleep(delay)
+                    _add_wait(delay)
+                REGISTRY.inc("rate_limit_retries_total", self._labels)
+                count("retries")
+                logging.warning(f"{self.name} request failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+
+    def call(self, fn, tokens=0, key=None):
+        if key is None:
+            return self._call(fn, tokens)
+        result, shared = self._flight.do(key, lambda: self._call(fn, tokens))
+        if shared:
+            REGISTRY.inc("rate_limit_coalesced_total", self._labels)
+            count("coalesced")
+        return result
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(provider):
+    with _limiters_lock:
+        if provider not in _limiters:
+            limits = PROVIDER_LIMITS.get(provider, {"rpm": 60, "tpm": None})
+            _limiters[provider] = RateLimiter(provider, limits["rpm"], limits["tpm"])
+        return _limiters[provider]
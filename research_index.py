@@ -0,0 +1,303 @@
+import os
+import re
+import json
+import time
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+import numpy as np
+from typing import Optional
+from pydantic import BaseModel, Field
+from cache import hash_key
+from embeddings import get_embedder
+from metrics import annotate, span
+
+try:
+    from crewai.tools import BaseTool
+except ImportError:
+    from crewai_tools import BaseTool
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on Windows; run one writer process there
+    fcntl = None
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+RESEARCH_DIR = os.getenv("RESEARCH_INDEX_DIR", os.path.join(".cache", "research"))
+# Chunks older than this are expired; competitor landscapes change slowly
+RESEARCH_MAX_AGE = float(os.getenv("RESEARCH_MAX_AGE", 30 * 24 * 60 * 60))
+# Seconds between expiry passes made while adding
+EXPIRE_INTERVAL = float(os.getenv("RESEARCH_EXPIRE_INTERVAL", 60 * 60))
+CHUNK_CHARS = 800
+CHUNK_OVERLAP = 100
+# Results scoring below this are not worth showing to an agent
+MIN_SCORE = float(os.getenv("RESEARCH_MIN_SCORE", 0.2))
+INITIAL_CAPACITY = 256
+
+# Country of the campaign being generated. Agents are pooled across runs, so
+# their one search tool reads it per call instead of being built per country.
+current_country = contextvars.ContextVar("research_country", default=None)
+
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+def chunk_text(text, size=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    # Packs whole paragraphs into chunks of about `size` characters; longer
+    # paragraphs are cut into overlapping windows.
+    chunks = []
+    current = ""
+    for paragraph in PARAGRAPH_RE.split(str(text or "")):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) > size:
+            if current:
+                chunks.append(current)
+                current = ""
+            step = size - overlap
+            chunks.extend(paragraph[start:start + size] for start in range(0, len(paragraph) - overlap, step))
+        elif len(current) + len(paragraph) + 2 > size:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ResearchIndex:
+    # Embeddings live in a memory-mapped float32 matrix on disk, one row per
+    # chunk; chunk text and metadata are kept in a JSON file alongside it.
+    # Expired chunks are tombstoned and compacted away once they pile up.
+    # The app and batch.py may share the directory: every access holds a
+    # lock file and first reloads the metadata if another process saved it.
+    def __init__(self, directory=RESEARCH_DIR, embedder=None, max_age=RESEARCH_MAX_AGE, expire_interval=EXPIRE_INTERVAL):
+        self.directory = directory
+        self.embedder = embedder or get_embedder()
+        self.max_age = max_age
+        self.expire_interval = expire_interval
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._chunks = []
+        self._ids = {}
+        self._dim = None
+        self._stamp = None
+        self._expired_at = 0.0
+        os.makedirs(self.directory, exist_ok=True)
+        self.expire()
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.directory, "vectors.f32")
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.directory, "chunks.json")
+
+    def _disk_stamp(self):
+        # Saves replace the file, so a new inode marks every save
+        try:
+            stat = os.stat(self._meta_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def _locked(self, shared=False):
+        with self._lock:
+            with open(os.path.join(self.directory, "lock"), "a") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try:
+                    if self._disk_stamp() != self._stamp:
+                        self._load()
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        self._stamp = self._disk_stamp()
+        self._chunks = []
+        self._dim = None
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("embedder") == self.embedder.name:
+                self._chunks = meta["chunks"]
+                self._dim = meta["dim"]
+            else:
+                logging.error(f"Rebuilding research index built with {meta.get('embedder')}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Discarding unreadable research index: {e}")
+            self._chunks = []
+            self._dim = None
+        self._matrix = None
+        if self._dim:
+            # Maps the file as another process may have grown it; it only
+            # grows here if rows are missing, which no reader can race
+            rows = os.path.getsize(self._vectors_path) // (self._dim * 4) if os.path.exists(self._vectors_path) else 0
+            self._open(max(len(self._chunks), rows, 1))
+        self._ids = {chunk["id"]: row for row, chunk in enumerate(self._chunks) if chunk}
+
+    def _open(self, capacity):
+        # Grows (or creates) the vectors file and maps it
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        size = capacity * self._dim * 4
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+
+    def _save(self):
+        self._matrix.flush()
+        meta = {"embedder": self.embedder.name, "dim": self._dim, "chunks": self._chunks}
+        tmp_path = f"{self._meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_path, self._meta_path)
+        except OSError as e:
+            logging.error(f"Failed to save research index: {e}")
+        self._stamp = self._disk_stamp()
+
+    def add(self, text, source, country=None):
+        # Re-adding a chunk only refreshes its age; new chunks are embedded
+        # in one batch and appended.
+        now = time.time()
+        with self._locked():
+            new = []
+            seen = set()
+            for chunk in chunk_text(text):
+                chunk_id = hash_key(chunk, country)
+                if chunk_id in seen:
+                    continue
+                seen.add(chunk_id)
+                row = self._ids.get(chunk_id)
+                if row is not None:
+                    self._chunks[row]["added"] = now
+                else:
+                    new.append((chunk_id, chunk))
+            if new:
+                vectors = self.embedder.embed([chunk for _, chunk in new])
+                if self._dim is None:
+                    # Rows left by an index built with another embedder
+                    # are of no use
+                    if os.path.exists(self._vectors_path):
+                        os.remove(self._vectors_path)
+                    self._dim = vectors.shape[1]
+                    self._open(INITIAL_CAPACITY)
+                needed = len(self._chunks) + len(new)
+                if needed > self._matrix.shape[0]:
+                    self._open(max(needed, 2 * self._matrix.shape[0]))
+                start = len(self._chunks)
+                self._matrix[start:needed] = vectors
+                for offset, (chunk_id, chunk) in enumerate(new):
+                    self._ids[chunk_id] = start + offset
+                    self._chunks.append({"id": chunk_id, "text": chunk, "source": source, "country": country, "added": now})
+            # A long-running process drops stale chunks as it goes
+            if now - self._expired_at >= self.expire_interval:
+                self._expire(now - self.max_age)
+            if self._dim is not None:
+                self._save()
+        return len(new)
+
+    def expire(self, max_age=None):
+        cutoff = time.time() - (max_age if max_age is not None else self.max_age)
+        with self._locked():
+            expired = self._expire(cutoff)
+            if expired and self._dim is not None:
+                self._save()
+        return expired
+
+    def _expire(self, cutoff):
+        # Tombstones stale chunks and compacts once a quarter are dead
+        self._expired_at = time.time()
+        expired = 0
+        for row, chunk in enumerate(self._chunks):
+            if chunk and chunk["added"] < cutoff:
+                self._ids.pop(chunk["id"], None)
+                self._chunks[row] = None
+                expired += 1
+        dead = sum(chunk is None for chunk in self._chunks)
+        if self._chunks and dead * 4 >= len(self._chunks):
+            self._compact()
+        return expired
+
+    def _compact(self):
+        live = [row for row, chunk in enumerate(self._chunks) if chunk]
+        vectors = np.array(self._matrix[live]) if live else None
+        self._chunks = [self._chunks[row] for row in live]
+        self._ids = {chunk["id"]: row for row, chunk in enumerate(self._chunks)}
+        if vectors is not None:
+            self._matrix[:len(live)] = vectors
+        self._save()
+
+    def search(self, query, k=5, country=None, min_score=MIN_SCORE):
+        if not len(self):
+            return []
+        query_vector = self.embedder.embed([query])[0]
+        # Chunks past max_age are skipped even before expire() removes them
+        cutoff = time.time() - self.max_age
+        with self._locked(shared=True):
+            count = len(self._chunks)
+            if not count:
+                return []
+            scores = np.asarray(self._matrix[:count] @ query_vector)
+            live = np.array([chunk is not None and chunk["added"] >= cutoff
+                             and (country is None or chunk["country"] in (country, None))
+                             for chunk in self._chunks])
+            scores = np.where(live, scores, -np.inf)
+            k = min(k, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            now = time.time()
+            results = [
+                {**self._chunks[row], "score": round(float(scores[row]), 3), "age_days": round((now - self._chunks[row]["added"]) / 86400, 1)}
+                for row in top if scores[row] >= min_score
+            ]
+        annotate(research_hits=len(results))
+        return results
+
+    def __len__(self):
+        with self._locked(shared=True):
+            return sum(chunk is not None for chunk in self._chunks)
+
+
+# Shared by every agent and every session in the process
+research_index = ResearchIndex()
+
+
+class ResearchSearchInput(BaseModel):
+    search_query: str = Field(..., description="What to look up in past research")
+
+
+class ResearchIndexTool(BaseTool):
+    name: str = "Search past research"
+    description: str = (
+        "Search earlier market research reports and scraped website content. "
+        "Use this before searching the internet; only go to the web when it has nothing relevant or recent enough."
+    )
+    args_schema: type = ResearchSearchInput
+    k: int = 4
+    # Searches this country's research; by default the running campaign's
+    country: Optional[str] = None
+
+    def _run(self, search_query: str) -> str:
+        with span("tool", self.name):
+            results = research_index.search(search_query, k=self.k, country=self.country or current_country.get())
+        if not results:
+            return "No relevant past research found. Search the internet instead."
+        return "\n\n".join(
+            f"[{result['source']}, {result['age_days']} days old, relevance {result['score']}]\n{result['text']}"
+            for result in results
+        )
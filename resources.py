@@ -0,0 +1,49 @@
+import functools
+
+# Heavy imports (crewai, langchain) happen inside these functions so that a
+# Streamlit rerun only pays for them once generation actually starts. Every
+# resource is built once per process and configuration.
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+@functools.lru_cache(maxsize=8)
+def get_agents(model_name=DEFAULT_MODEL, openai_api_key=None, serper_api_key=None, streaming=False):
+    # The Serper key is read from the environment by the tool at call time;
+    # it is part of the cache key so a new key gets fresh tools.
+    from agents import MarketingAnalysisAgents
+    return MarketingAnalysisAgents(model_name=model_name, openai_api_key=openai_api_key, streaming=streaming)
+
+
+@functools.lru_cache(maxsize=1)
+def get_tasks():
+    from tasks import MarketingAnalysisTasks
+    return MarketingAnalysisTasks()
+
+
+@functools.lru_cache(maxsize=8)
+def get_chat_client(openai_api_key=None, model_name=None):
+    from openai_client import chat_openai
+    kwargs = {"openai_api_key": openai_api_key} if openai_api_key else {}
+    if model_name:
+        kwargs["model_name"] = model_name
+    return chat_openai(**kwargs)
+
+
+@functools.lru_cache(maxsize=1)
+def get_task_cache():
+    from cache import TaskCache
+    return TaskCache()
+
+
+@functools.lru_cache(maxsize=1)
+def get_stage_store():
+    from incremental import StageStore
+    return StageStore()
+
+
+@functools.lru_cache(maxsize=1)
+def get_results_store():
+    # One store, and one connection per thread, for the whole process
+    from results import ResultsStore
+    return ResultsStore()
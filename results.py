@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+RESULTS_DB = os.getenv("RESULTS_DB", os.path.join(".data", "results.db"))
+
+# Columns the sidebar options are stored in, each with its own index
+FILTERS = ("country", "platform", "tone", "audience")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    country TEXT,
+    platform TEXT,
+    tone TEXT,
+    audience TEXT,
+    keywords TEXT,
+    image_style TEXT,
+    ad_copy TEXT,
+    outputs TEXT NOT NULL,
+    images TEXT NOT NULL,
+    stages TEXT NOT NULL,
+    timings TEXT NOT NULL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created);
+CREATE INDEX IF NOT EXISTS runs_country ON runs (country, created);
+CREATE INDEX IF NOT EXISTS runs_platform ON runs (platform, created);
+CREATE INDEX IF NOT EXISTS runs_tone ON runs (tone, created);
+CREATE INDEX IF NOT EXISTS runs_audience ON runs (audience, created);
+"""
+
+JSON_COLUMNS = ("outputs", "images", "stages", "timings")
+SUMMARY_COLUMNS = ("id", "created", "country", "platform", "tone", "audience", "keywords", "image_style", "duration")
+
+
+class ResultsStore:
+    # One row per run in an SQLite database in WAL mode, so job threads can
+    # write while pages read. Each thread gets its own connection.
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, run_id, options, result, outputs=None, created=None):
+        row = {
+            "id": run_id,
+            "created": created or time.time(),
+            "country": options.get("country"),
+            "platform": options.get("platform"),
+            "tone": options.get("tone"),
+            "audience": options.get("audience"),
+            "keywords": options.get("keywords"),
+            "image_style": options.get("image_style"),
+            "ad_copy": result.get("ad_copy"),
+            "outputs": json.dumps(outputs or {}, ensure_ascii=False),
+            "images": json.dumps(result.get("images") or [], ensure_ascii=False),
+            "stages": json.dumps(result.get("stages") or [], ensure_ascii=False),
+            "timings": json.dumps({"metrics": result.get("metrics"), "latency": result.get("latency")}, ensure_ascii=False, default=str),
+            "duration": result.get("duration"),
+        }
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{name}" for name in row)
+        try:
+            with self._connect() as conn:
+                conn.execute(f"INSERT OR REPLACE INTO runs ({columns}) VALUES ({placeholders})", row)
+        except sqlite3.Error as e:
+            logging.error(f"Failed to save run {run_id}: {e}")
+            raise
+
+    def get(self, run_id):
+        row = self._connect().execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        for name in JSON_COLUMNS:
+            run[name] = json.loads(run[name])
+        return run
+
+    def list_runs(self, limit=20, offset=0, **filters):
+        # Newest first, optionally narrowed by any of FILTERS
+        unknown = set(filters) - set(FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+        where = [f"{name} = ?" for name, value in filters.items() if value is not None]
+        params = [value for value in filters.values() if value is not None]
+        query = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM runs"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY created DESC LIMIT ? OFFSET ?"
+        rows = self._connect().execute(query, (*params, limit, offset)).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, run_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+
+def render_text(ad_copy, images):
+    # The downloadable summary of a run, built in memory
+    parts = []
+    if ad_copy:
+        parts.append(f"Instagram Caption:\n{ad_copy}\n\n")
+    for image in images:
+        parts.append(f"Generated Image: {image['path']}\nDescription: {image['description']}\n\n")
+    return "".join(parts)
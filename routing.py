@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import threading
+import contextvars
+import logging
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatResult, ChatGeneration
+from metrics import REGISTRY, annotate, count
+from ratelimit import waited
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+# Model, alternate model and timings per agent factory. budget_s bounds a
+# single request; after hedge_after_s without an answer the same request is
+# also sent to the fallback model and whichever answers first wins.
+DEFAULT_ROUTE = {"model": None, "fallback": "gpt-4o-mini", "budget_s": 60.0, "hedge_after_s": 20.0}
+ROUTES = {
+    "product_competitor_agent": {"model": "gpt-4o", "fallback": "gpt-4o-mini", "budget_s": 90.0, "hedge_after_s": 30.0},
+    "strategy_planner_agent": {"model": "gpt-4o", "fallback": "gpt-4o-mini", "budget_s": 90.0, "hedge_after_s": 30.0},
+    "creative_content_creator_agent": {"model": "gpt-4o-mini", "fallback": "gpt-4o", "budget_s": 45.0, "hedge_after_s": 15.0},
+    "senior_photographer_agent": {"model": "gpt-4o-mini", "fallback": "gpt-4.1-mini", "budget_s": 30.0, "hedge_after_s": 10.0},
+    "chief_creative_director_agent": {"model": "gpt-4o-mini", "fallback": "gpt-4o", "budget_s": 45.0, "hedge_after_s": 15.0},
+}
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = float(os.getenv("ROUTE_EWMA_ALPHA", 0.3))
+# Hedge once a request runs this many times the model's typical latency
+HEDGE_FACTOR = 2.0
+MIN_HEDGE_S = 2.0
+# A model's failure rate halves for every this many seconds it is not
+# called, so a demoted primary is tried first again once it has rested
+STATS_HALF_LIFE = float(os.getenv("ROUTE_STATS_HALF_LIFE", 60.0))
+
+
+
+def start_call(fn, *args):
+    # Each routed request runs on a thread of its own rather than a shared
+    # pool: it starts at once, so its hedge and budget timers measure the
+    # request and not time spent queued, and a request abandoned after the
+    # budget never holds up another. Abandoned requests end at the client
+    # timeout, which is the route's budget.
+    future = Future()
+    context = contextvars.copy_context()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(fn, *args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="llm-route", daemon=True).start()
+    return future
+
+
+def load_routes(default_model):
+    # MODEL_ROUTES may hold JSON, or the path of a JSON file, overriding
+    # fields per agent, e.g. {"senior_photographer_agent": {"model": "gpt-4.1-nano"}}
+    routes = {name: dict(route) for name, route in ROUTES.items()}
+    override = os.getenv("MODEL_ROUTES")
+    if override:
+        try:
+            if os.path.exists(override):
+                with open(override, "r", encoding="utf-8") as f:
+                    override = f.read()
+            for name, route in json.loads(override).items():
+                routes.setdefault(name, {}).update(route)
+        except (OSError, ValueError, AttributeError) as e:
+            logging.error(f"Ignoring invalid MODEL_ROUTES: {e}")
+    for route in routes.values():
+        for key, value in DEFAULT_ROUTE.items():
+            route.setdefault(key, value)
+        route["model"] = route["model"] or default_model
+    return routes
+
+
+class LatencyTracker:
+    # Moving averages of latency and failure rate per model, fed by every
+    # routed request including hedges that lost the race.
+    def __init__(self, alpha=EWMA_ALPHA, half_life=STATS_HALF_LIFE):
+        self.alpha = alpha
+        self.half_life = half_life
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._failures = {}
+        self._updated = {}
+
+    def _failure_rate(self, model, now):
+        rate = self._failures.get(model, 0.0)
+        if rate and self.half_life:
+            rate *= 0.5 ** ((now - self._updated[model]) / self.half_life)
+        return rate
+
+    def record(self, model, seconds, ok=True):
+        now = time.monotonic()
+        with self._lock:
+            if ok:
+                previous = self._latency.get(model)
+                self._latency[model] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+            previous = self._failure_rate(model, now)
+            self._failures[model] = previous + self.alpha * ((0.0 if ok else 1.0) - previous)
+            self._updated[model] = now
+        REGISTRY.observe("route_latency_seconds", {"model": model, "ok": ok}, seconds)
+
+    def latency(self, model):
+        with self._lock:
+            return self._latency.get(model)
+
+    def failure_rate(self, model):
+        with self._lock:
+            return self._failure_rate(model, time.monotonic())
+
+    def recent(self, model):
+        # Whether the model was called within the last half-life
+        with self._lock:
+            updated = self._updated.get(model)
+        return updated is not None and time.monotonic() - updated < self.half_life
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            return {model: {"latency_s": round(latency, 3), "failure_rate": round(self._failure_rate(model, now), 3)}
+                    for model, latency in self._latency.items()}
+
+
+# Shared by every route, so one slow agent's observations help the others
+latency_tracker = LatencyTracker()
+
+
+class RoutedChatModel(BaseChatModel):
+    # Sends each request to the route's preferred model, hedges it on the
+    # alternate model when it runs long, and falls back when it fails.
+    route: str
+    model_name: str
+    clients: dict
+    fallback: str = None
+    budget_s: float = 60.0
+    hedge_after_s: float = 20.0
+
+    @property
+    def _llm_type(self):
+        return "routed-chat"
+
+    def _order(self):
+        # Prefer the fallback while the primary is degraded: failing often,
+        # or recently slower than the budget while the fallback is not.
+        # Both wear off once the primary has not been called for a while.
+        if not self.fallback:
+            return [self.model_name]
+        primary, fallback = self.model_name, self.fallback
+        slow = (latency_tracker.recent(primary) and (latency_tracker.latency(primary) or 0) > self.budget_s
+                and (latency_tracker.latency(fallback) or 0) < self.budget_s)
+        failing = latency_tracker.failure_rate(primary) > 0.5 > latency_tracker.failure_rate(fallback)
+        return [fallback, primary] if slow or failing else [primary, fallback]
+
+    def _hedge_delay(self, model):
+        typical = latency_tracker.latency(model)
+        if typical is None:
+            return self.hedge_after_s
+        return min(self.hedge_after_s, max(MIN_HEDGE_S, HEDGE_FACTOR * typical))
+
+    def _call(self, model, messages, stop, kwargs):
+        # Time spent in the rate limiter is local queueing, not model latency
+        started = time.monotonic()
+        throttled = waited()
+        try:
+            message = self.clients[model].invoke(messages, stop=stop, **kwargs)
+        except Exception:
+            latency_tracker.record(model, time.monotonic() - started - (waited() - throttled), ok=False)
+            raise
+        latency_tracker.record(model, time.monotonic() - started - (waited() - throttled))
+        return message
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        order = self._order()
+        launched = {}
+        errors = []
+
+        def launch(model):
+            # Hedges run on their own threads but in this task's context
+            launched[start_call(self._call, model, messages, stop, kwargs)] = model
+            # Timers count from when the request is actually running
+            return time.monotonic()
+
+        started = launch(order[0])
+        hedge_at = started + self._hedge_delay(order[0])
+        deadline = started + self.budget_s
+        pending = set(launched)
+        while pending:
+            now = time.monotonic()
+            more = len(launched) < len(order)
+            timeout = max(0.0, (hedge_at if more else deadline) - now)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    message = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                model = launched[future]
+                if model != order[0]:
+                    REGISTRY.inc("route_fallback_wins_total", {"route": self.route, "model": model})
+                annotate(model=model)
+                return ChatResult(generations=[ChatGeneration(message=message)])
+
+            now = time.monotonic()
+            if more and (not pending or now >= hedge_at):
+                model = order[len(launched)]
+                kind = "hedge" if pending else "fallback"
+                REGISTRY.inc(f"route_{kind}s_total", {"route": self.route, "model": model})
+                count(f"{kind}s")
+                # The new request gets a full budget of its own
+                deadline = launch(model) + self.budget_s
+                pending = {future for future in launched if not future.done()}
+            elif not more and now >= deadline and pending:
+                REGISTRY.inc("route_budget_exceeded_total", {"route": self.route})
+                raise TimeoutError(f"{self.route} got no answer within {self.budget_s:g}s from {', '.join(order)}")
+
+        logging.error(f"All models failed for {self.route}: {errors[-1]}")
+        raise errors[-1]
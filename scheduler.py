@@ -0,0 +1,87 @@
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+# Name of the graph node a worker is executing, for instrumentation
+current_task = contextvars.ContextVar("current_task", default=None)
+
+
+class TaskGraph:
+    # Each node is built lazily from the outputs of its dependencies, so
+    # prompts that interpolate upstream results (e.g. the ad copy) work too.
+    def __init__(self):
+        self.nodes = {}
+
+    def add(self, name, build, depends_on=(), use_context=True):
+        # use_context=False is for tasks that already embed their upstream
+        # output in the prompt and should not receive it a second time.
+        if name in self.nodes:
+            raise ValueError(f"Duplicate task in graph: {name}")
+        self.nodes[name] = (build, tuple(depends_on), use_context)
+
+    def order(self):
+        # Kahn's algorithm; also validates the graph before anything runs
+        for name, (_, deps, _) in self.nodes.items():
+            missing = [dep for dep in deps if dep not in self.nodes]
+            if missing:
+                raise ValueError(f"Task {name} depends on unknown tasks: {missing}")
+
+        remaining = {name: set(deps) for name, (_, deps, _) in self.nodes.items()}
+        ordered = []
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Cycle detected between tasks: {sorted(remaining)}")
+            for name in ready:
+                ordered.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return ordered
+
+    def run(self, runner, max_workers=4, completed=None, initializer=None, prepare_context=None):
+        # runner(task, context) executes one task; nodes present in
+        # `completed` are treated as already done and are not re-run.
+        # prepare_context(name, task, parts) builds the context from the
+        # upstream outputs instead of joining them as they are.
+        self.order()
+        outputs = dict(completed or {})
+        pending = {name: deps for name, (_, deps, _) in self.nodes.items() if name not in outputs}
+        running = {}
+
+        def execute(name):
+            current_task.set(name)
+            build, deps, use_context = self.nodes[name]
+            upstream = {dep: outputs[dep] for dep in deps}
+            task = build(upstream)
+            parts = [str(upstream[dep]) for dep in deps if upstream[dep]] if use_context else []
+            if prepare_context:
+                context = prepare_context(name, task, parts)
+            else:
+                context = "\n\n".join(parts) or None
+            return runner(task, context)
+
+        executor = ThreadPoolExecutor(max_workers=max_workers, initializer=initializer)
+        while pending or running:
+            for name in [n for n, deps in pending.items() if all(dep in outputs for dep in deps)]:
+                del pending[name]
+                # Copy the caller's context so context variables (log
+                # routing, metrics) follow the task onto the worker.
+                running[executor.submit(contextvars.copy_context().run, execute, name)] = name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    outputs[name] = future.result()
+                except Exception as e:
+                    logging.error(f"Task {name} failed: {e}")
+                    # Tasks already running cannot be stopped; the failure
+                    # is raised without waiting for them to finish
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+        executor.shutdown()
+        return outputs
@@ -0,0 +1,134 @@
+import time
+import threading
+import contextvars
+from langchain_core.callbacks import BaseCallbackHandler
+from scheduler import current_task
+from metrics import annotate
+
+FINAL_ANSWER = "Final Answer:"
+
+# Streams of the run executing in this context, if streaming is enabled
+_current_streams = contextvars.ContextVar("task_streams", default=None)
+
+
+class TaskStreams:
+    # Collects streamed tokens per task. Only the text after the agent's
+    # "Final Answer:" marker is shown; thoughts and tool calls are not.
+    # Several LLM calls can stream under one task at once (hedged requests,
+    # ad copy candidates), so tokens are buffered per call and each task
+    # shows the call furthest into its answer.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sections = {}
+
+    def attach(self):
+        return _current_streams.set(self)
+
+    def detach(self, token):
+        _current_streams.reset(token)
+
+    def _section(self, name):
+        return self._sections.setdefault(name, {
+            "started": time.monotonic(), "calls": {}, "output": None, "ttft_s": None, "complete_s": None,
+        })
+
+    def start(self, name):
+        with self._lock:
+            self._section(name)["started"] = time.monotonic()
+
+    def llm_start(self, name, run_id):
+        # Each agent iteration is a new LLM call; finished calls that never
+        # reached a final answer were thoughts or tool calls and are dropped.
+        with self._lock:
+            calls = self._section(name)["calls"]
+            for key in [key for key, call in calls.items() if call["ended"] and not _answer(call["tokens"])]:
+                del calls[key]
+            calls[run_id] = {"tokens": [], "ended": False}
+
+    def llm_end(self, name, run_id):
+        with self._lock:
+            call = self._section(name)["calls"].get(run_id)
+            if call:
+                call["ended"] = True
+
+    def token(self, name, run_id, token):
+        with self._lock:
+            section = self._section(name)
+            section["calls"].setdefault(run_id, {"tokens": [], "ended": False})["tokens"].append(token)
+            first = section["ttft_s"] is None
+            if first:
+                section["ttft_s"] = round(time.monotonic() - section["started"], 3)
+        if first:
+            annotate(ttft_s=section["ttft_s"])
+
+    def finish(self, name, output):
+        with self._lock:
+            section = self._section(name)
+            section["output"] = output
+            section["complete_s"] = round(time.monotonic() - section["started"], 3)
+
+    def snapshot(self):
+        sections = {}
+        with self._lock:
+            for name, section in self._sections.items():
+                text = section["output"]
+                if text is None:
+                    text = max((_answer(call["tokens"]) for call in section["calls"].values()), key=len, default="")
+                sections[name] = {
+                    "text": text,
+                    "done": section["output"] is not None,
+                    "ttft_s": section["ttft_s"],
+                    "complete_s": section["complete_s"],
+                }
+        return sections
+
+
+def _answer(tokens):
+    _, marker, answer = "".join(tokens).rpartition(FINAL_ANSWER)
+    return answer.strip() if marker else ""
+
+
+def task_started(name):
+    streams = _current_streams.get()
+    if streams is not None:
+        streams.start(name)
+
+
+def task_finished(name, output):
+    streams = _current_streams.get()
+    if streams is not None:
+        streams.finish(name, output)
+
+
+class StreamingCallbackHandler(BaseCallbackHandler):
+    # Forwards tokens from a streaming chat model to the task that is running
+
+    def _streams(self):
+        streams = _current_streams.get()
+        name = current_task.get()
+        return (streams, name) if streams is not None and name else (None, None)
+
+    def on_llm_start(self, serialized, prompts, run_id=None, **kwargs):
+        streams, name = self._streams()
+        if streams:
+            streams.llm_start(name, run_id)
+
+    def on_chat_model_start(self, serialized, messages, run_id=None, **kwargs):
+        streams, name = self._streams()
+        if streams:
+            streams.llm_start(name, run_id)
+
+    def on_llm_new_token(self, token, run_id=None, **kwargs):
+        streams, name = self._streams()
+        if streams and token:
+            streams.token(name, run_id, token)
+
+    def on_llm_end(self, response, run_id=None, **kwargs):
+        streams, name = self._streams()
+        if streams:
+            streams.llm_end(name, run_id)
+
+    def on_llm_error(self, error, run_id=None, **kwargs):
+        streams, name = self._streams()
+        if streams:
+            streams.llm_end(name, run_id)
@@ -1,15 +1,27 @@
 from crewai import Task
 from textwrap import dedent
 
-PRODUCT_WEBSITE = "https://australiatravelsafe.com.au, https://www.australiatravelsafe.com.au/flightsafe/"
+PRODUCT_URLS = ["https://australiatravelsafe.com.au", "https://www.australiatravelsafe.com.au/flightsafe/"]
+PRODUCT_WEBSITE = ", ".join(PRODUCT_URLS)
 PRODUCT_DETAILS = "Australia Travel Safe offers comprehensive safety information and travel tips for tourists exploring Australia. Our services include up-to-date safety alerts, travel itineraries, and guides to help ensure a safe and enjoyable journey."
 
 class MarketingAnalysisTasks:
+    # Upstream tasks whose outputs each task receives as context
+    dependencies = {
+        "product_analysis": (),
+        "competitor_analysis": (),
+        "campaign_development": ("product_analysis", "competitor_analysis"),
+        "instagram_ad_copy": ("campaign_development",),
+        "take_photograph_task": ("instagram_ad_copy",),
+        "review_photo": ("take_photograph_task",),
+    }
+
     def product_analysis(self, agent, country):
         return Task(
             description=dedent(f"""\
                 Analyze the {country} Travel Safe website: {PRODUCT_WEBSITE}.
                 Extra details provided by the company: {PRODUCT_DETAILS}.
+                Check past research first and only search the web for what it does not cover.
 
                 Focus on identifying unique features, benefits, and the overall narrative presented.
 
@@ -29,6 +41,7 @@ class MarketingAnalysisTasks:
             description=dedent(f"""\
                 Explore competitors of {country} Travel Safe: {PRODUCT_WEBSITE}.
                 Extra details provided by the company: {PRODUCT_DETAILS}.
+                Check past research first and only search the web for what it does not cover.
 
                 Identify the top 3 competitors and analyze their strategies, market positioning, and customer perception.
 
@@ -0,0 +1,51 @@
+import os
+import json
+import time
+from cache import DiskCache, hash_key
+from tool_cache import ToolCache
+
+
+def backdate(cache, key, seconds):
+    # Rewrites an entry as if it had been stored `seconds` earlier
+    entry = cache.get_entry(key)
+    entry["created_at"] -= seconds
+    with open(cache._path(key), "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = DiskCache(directory=str(tmp_path), ttl=60)
+    cache.set("fresh", 1)
+    cache.set("stale", 2)
+    backdate(cache, "stale", 120)
+
+    assert cache.get("fresh") == 1
+    assert cache.get("stale") is None
+    assert not os.path.exists(cache._path("stale"))
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = DiskCache(directory=str(tmp_path), ttl=0, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    old = time.time() - 10
+    os.utime(cache._path("a"), (old, old))
+    os.utime(cache._path("b"), (old - 5, old - 5))
+    # Reading refreshes the mtime that orders eviction
+    cache.get("b")
+    cache.set("c", 3)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.get("c") == 3
+
+
+def test_tool_cache_promotion_keeps_the_disk_entry_age(tmp_path):
+    ToolCache(directory=str(tmp_path), ttl=60).fetch("search", "query", lambda: "result")
+    key = hash_key("search", "query")
+    cache = ToolCache(directory=str(tmp_path), ttl=60)
+    backdate(cache.disk, key, 59)
+
+    # Found on disk; the memory copy expires when the disk entry does
+    assert cache.fetch("search", "query", lambda: "fresh") == "result"
+    assert cache._memory[key][0] <= time.time() + 1
@@ -0,0 +1,27 @@
+from compaction import Compactor, truncate, count_tokens, TRUNCATION_MARK
+
+
+def test_split_budget_gives_unused_share_to_larger_outputs():
+    compactor = Compactor(context_budget=1000)
+    assert compactor.split_budget([100, 2000, 3000]) == [100, 450, 450]
+    assert compactor.split_budget([100, 200]) == [100, 200]
+    assert compactor.split_budget([]) == []
+
+
+def test_context_keeps_every_upstream_output():
+    compactor = Compactor(context_budget=300)
+    short = "COMPETITOR: Safe Travels leads on price."
+    long = "\n\n".join(f"Paragraph {n} about the product and its many features." for n in range(200))
+    task = type("Task", (), {"description": "Develop a campaign"})()
+
+    context = compactor.context("campaign_development", task, [long, short])
+
+    assert short in context
+    assert TRUNCATION_MARK in context
+    assert count_tokens(context) <= 300 + 10
+    assert compactor.savings[0]["tokens_saved"] > 0
+
+
+def test_truncate_keeps_whole_leading_paragraphs():
+    text = "First finding.\n\nSecond finding.\n\n" + "Detail. " * 500
+    assert truncate(text, 20).startswith("First finding.\n\nSecond finding.")
@@ -0,0 +1,43 @@
+from incremental import StageStore, plan_stages, save_stages, REUSED, RECOMPUTED
+
+STAGES = [
+    ("analysis", ("product_analysis",), ("country",)),
+    ("image", ("review_photo",), ("image_style",)),
+]
+TASKS = ("product_analysis", "review_photo")
+OPTIONS = {"country": "Australia", "image_style": "Modern"}
+PROMPTS = {"product_analysis": ["Analyze the product", "A report"], "review_photo": ["Review the photos", "Three photos"]}
+SETTINGS = {"default": "gpt-4o-mini", "context_budget": 1500}
+
+
+def plan(store, options=OPTIONS, settings=SETTINGS, prompts=PROMPTS):
+    completed, stages = plan_stages(STAGES, TASKS, options, settings, store, prompts=prompts)
+    return completed, [stage["status"] for stage in stages], stages
+
+
+def test_unchanged_stages_are_reused(tmp_path):
+    store = StageStore(directory=str(tmp_path))
+    _, statuses, stages = plan(store)
+    assert statuses == [RECOMPUTED, RECOMPUTED]
+    save_stages(stages, {"product_analysis": "report", "review_photo": "photos"}, store)
+
+    completed, statuses, _ = plan(store)
+    assert statuses == [REUSED, REUSED]
+    assert completed == {"product_analysis": "report", "review_photo": "photos"}
+
+    # Only the later stage reads the image style
+    _, statuses, _ = plan(store, options={**OPTIONS, "image_style": "Vintage"})
+    assert statuses == [REUSED, RECOMPUTED]
+
+
+def test_changed_prompt_or_budget_recomputes(tmp_path):
+    store = StageStore(directory=str(tmp_path))
+    _, _, stages = plan(store)
+    save_stages(stages, {"product_analysis": "report", "review_photo": "photos"}, store)
+
+    prompts = {**PROMPTS, "product_analysis": ["Check past research first. Analyze the product", "A report"]}
+    _, statuses, _ = plan(store, prompts=prompts)
+    assert statuses == [RECOMPUTED, RECOMPUTED]
+
+    _, statuses, _ = plan(store, settings={**SETTINGS, "context_budget": 800})
+    assert statuses == [RECOMPUTED, RECOMPUTED]
@@ -0,0 +1,68 @@
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+import pytest
+import ratelimit
+from ratelimit import RateLimiter, TokenBucket, retry_after, is_retryable
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+def test_bucket_makes_callers_wait_for_their_share():
+    bucket = TokenBucket(per_minute=60, capacity=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(1.0, abs=0.05)
+    assert bucket.reserve() == pytest.approx(2.0, abs=0.05)
+
+
+def test_retry_after_forms():
+    assert retry_after(HTTPError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after(HTTPError(429, {"retry-after": "3"})) == 3.0
+    assert retry_after(HTTPError(429, {"retry-after": formatdate(time.time() + 30, usegmt=True)})) == pytest.approx(30, abs=2)
+    assert retry_after(HTTPError(429)) is None
+
+
+def test_retryable_errors():
+    assert is_retryable(HTTPError(503))
+    assert not is_retryable(HTTPError(400))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(ValueError())
+
+
+def test_call_retries_transient_failures(monkeypatch):
+    monkeypatch.setattr(ratelimit, "backoff_delay", lambda attempt: 0)
+    limiter = RateLimiter("test", rpm=6000, max_retries=2)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise HTTPError(503)
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert len(attempts) == 3
+
+    with pytest.raises(HTTPError):
+        limiter.call(lambda: (_ for _ in ()).throw(HTTPError(400)))
+
+
+def test_429_pauses_every_caller():
+    limiter = RateLimiter("test", rpm=6000, max_retries=1)
+    calls = []
+
+    def limited():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise HTTPError(429, {"retry-after-ms": "200"})
+        return "ok"
+
+    assert limiter.call(limited) == "ok"
+    assert calls[1] - calls[0] >= 0.19
+    assert ratelimit.waited() >= 0.19
@@ -0,0 +1,44 @@
+import time
+from embeddings import HashingEmbedder
+from research_index import ResearchIndex, chunk_text
+
+
+def index(directory, **kwargs):
+    return ResearchIndex(directory=str(directory), embedder=HashingEmbedder(dim=64), **kwargs)
+
+
+def test_chunks_pack_paragraphs():
+    text = "\n\n".join(["a" * 300, "b" * 300, "c" * 300])
+    assert [len(chunk) for chunk in chunk_text(text, size=800)] == [602, 300]
+
+
+def test_search_is_scoped_by_country_and_skips_expired_chunks(tmp_path):
+    research = index(tmp_path, max_age=60)
+    research.add("Travel insurance covers beach trips in Sydney.", source="au", country="Australia")
+    research.add("Travel insurance covers ski trips in Whistler.", source="ca", country="Canada")
+    assert [result["source"] for result in research.search("travel insurance trips", country="Canada", min_score=0)] == ["ca"]
+
+    research._chunks[research._ids[next(iter(research._ids))]]["added"] -= 120
+    assert [result["source"] for result in research.search("travel insurance trips", min_score=0)] == ["ca"]
+
+
+def test_adding_expires_stale_chunks_and_compacts(tmp_path):
+    research = index(tmp_path, max_age=60, expire_interval=0)
+    research.add("An old competitor report.", source="old")
+    research._chunks[0]["added"] = time.time() - 120
+    research.add("A fresh competitor report.", source="new")
+    assert len(research) == 1
+    assert [chunk["source"] for chunk in research._chunks] == ["new"]
+
+
+def test_writes_from_another_process_are_picked_up(tmp_path):
+    # Two instances on one directory stand in for the app and batch.py
+    app, batch = index(tmp_path), index(tmp_path)
+    app.add("Beach safety tips for families in Queensland.", source="app")
+    batch.add("Snow safety tips for skiers in the Alps.", source="batch")
+    app.add("Desert driving tips for the outback.", source="app")
+
+    for research in (app, batch, index(tmp_path)):
+        assert len(research) == 3
+        top = research.search("skiers in the Alps", k=1, min_score=0)
+        assert top[0]["source"] == "batch"
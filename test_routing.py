@@ -0,0 +1,78 @@
+import time
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+import ratelimit
+import routing
+from routing import LatencyTracker, RoutedChatModel
+
+
+class FakeClient:
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def invoke(self, messages, stop=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        return AIMessage(content=self.name)
+
+
+@pytest.fixture(autouse=True)
+def tracker(monkeypatch):
+    tracker = LatencyTracker(half_life=0.2)
+    monkeypatch.setattr(routing, "latency_tracker", tracker)
+    return tracker
+
+
+def model(primary, fallback, budget_s=2.0, hedge_after_s=0.2):
+    return RoutedChatModel(route="test", model_name=primary.name, fallback=fallback.name, budget_s=budget_s,
+                           hedge_after_s=hedge_after_s, clients={primary.name: primary, fallback.name: fallback})
+
+
+def ask(llm):
+    return llm.invoke([HumanMessage(content="hi")]).content
+
+
+def test_slow_primary_is_hedged():
+    assert ask(model(FakeClient("p", delay=1.0), FakeClient("f"))) == "f"
+
+
+def test_failed_primary_falls_back():
+    assert ask(model(FakeClient("p", fail=True), FakeClient("f"))) == "f"
+
+
+def test_no_answer_within_budget_times_out():
+    llm = model(FakeClient("p", delay=1.0), FakeClient("f", delay=1.0), budget_s=0.3, hedge_after_s=0.1)
+    with pytest.raises(TimeoutError):
+        ask(llm)
+
+
+def test_demoted_primary_recovers(tracker):
+    primary, fallback = FakeClient("p", fail=True), FakeClient("f")
+    llm = model(primary, fallback)
+    for _ in range(3):
+        ask(llm)
+    assert llm._order() == ["f", "p"]
+
+    primary.fail = False
+    time.sleep(0.5)
+    assert llm._order() == ["p", "f"]
+    assert ask(llm) == "p"
+
+
+def test_throttling_is_not_counted_as_latency(tracker):
+    class Throttled(FakeClient):
+        def invoke(self, messages, stop=None, **kwargs):
+            # What RateLimiter.acquire does when the bucket is empty
+            time.sleep(0.5)
+            ratelimit._add_wait(0.5)
+            return super().invoke(messages, stop=stop, **kwargs)
+
+    # Its own model name, so requests abandoned by earlier tests cannot
+    # report into this tracker
+    assert ask(model(Throttled("throttled"), FakeClient("f"), hedge_after_s=1.5)) == "throttled"
+    assert tracker.latency("throttled") < 0.2
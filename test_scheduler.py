@@ -0,0 +1,45 @@
+import time
+import pytest
+from scheduler import TaskGraph, current_task
+
+
+def graph(**deps):
+    tasks = TaskGraph()
+    for name, depends_on in deps.items():
+        tasks.add(name, lambda up, name=name: (name, up), depends_on)
+    return tasks
+
+
+def test_order_puts_dependencies_first():
+    order = graph(copy=("campaign",), campaign=("product", "competitor"), product=(), competitor=()).order()
+    assert order.index("campaign") > max(order.index("product"), order.index("competitor"))
+    assert order.index("copy") > order.index("campaign")
+
+
+def test_cycles_and_unknown_dependencies_are_rejected():
+    with pytest.raises(ValueError, match="Cycle"):
+        graph(a=("b",), b=("a",)).order()
+    with pytest.raises(ValueError, match="unknown"):
+        graph(a=("missing",)).order()
+
+
+def test_run_passes_upstream_outputs_and_skips_completed():
+    def runner(task, context):
+        name, up = task
+        return f"{name}<{context}>" if up else name
+
+    outputs = graph(product=(), competitor=(), campaign=("product", "competitor")).run(runner, completed={"product": "stored"})
+    assert outputs == {"product": "stored", "competitor": "competitor", "campaign": "campaign<stored\n\ncompetitor>"}
+
+
+def test_failure_does_not_wait_for_running_siblings():
+    def runner(task, context):
+        if current_task.get() == "product":
+            raise RuntimeError("product failed")
+        time.sleep(2)
+        return "done"
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError):
+        graph(product=(), competitor=()).run(runner)
+    assert time.monotonic() - started < 1
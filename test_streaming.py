@@ -0,0 +1,38 @@
+import uuid
+from scheduler import current_task
+from streaming import TaskStreams, StreamingCallbackHandler
+
+
+def test_concurrent_calls_of_one_task_do_not_interleave():
+    streams = TaskStreams()
+    token = streams.attach()
+    task_token = current_task.set("instagram_ad_copy")
+    handler = StreamingCallbackHandler()
+    first, second = uuid.uuid4(), uuid.uuid4()
+    try:
+        handler.on_chat_model_start({}, [], run_id=first)
+        handler.on_llm_new_token("Final Answer: Travel ", run_id=first)
+        # A hedge or another candidate starts while the first one streams
+        handler.on_chat_model_start({}, [], run_id=second)
+        handler.on_llm_new_token("Final Answer: Go", run_id=second)
+        handler.on_llm_new_token("safe in Sydney", run_id=first)
+        handler.on_llm_end(None, run_id=first)
+    finally:
+        current_task.reset(task_token)
+        streams.detach(token)
+
+    section = streams.snapshot()["instagram_ad_copy"]
+    assert section["text"] == "Travel safe in Sydney"
+    assert not section["done"]
+
+
+def test_thoughts_of_finished_calls_are_dropped():
+    streams = TaskStreams()
+    streams.llm_start("review_photo", "thought")
+    streams.token("review_photo", "thought", "Thought: I should search")
+    streams.llm_end("review_photo", "thought")
+    streams.llm_start("review_photo", "answer")
+    streams.token("review_photo", "answer", "Final Answer: Three photos")
+
+    assert list(streams._sections["review_photo"]["calls"]) == ["answer"]
+    assert streams.snapshot()["review_photo"]["text"] == "Three photos"
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+from embeddings import HashingEmbedder
+from metrics import RunMetrics, span
+from variants import fan_out_ad_copy
+
+OUTPUTS = [
+    "Option 1: Travel with peace of mind.\nOption 2: Insurance that follows you everywhere.",
+    "Option 1: Travel with peace of mind.\nOption 2: Explore hidden beaches without a worry.",
+    "Option 1: Families deserve carefree holidays.\nOption 2: Book cover in two minutes flat.",
+]
+
+
+def test_fan_out_counts_dropped_options_inside_a_run():
+    tasks = [SimpleNamespace(description=f"Write ad copy {index}\n", output=output) for index, output in enumerate(OUTPUTS)]
+    run = RunMetrics()
+    token = run.start()
+    try:
+        with span("task", "instagram_ad_copy") as record:
+            result = fan_out_ad_copy(tasks, lambda task, context: task.output, None, top_n=3, embedder=HashingEmbedder())
+    finally:
+        run.finish(token)
+
+    assert result.count("Option ") == 3
+    assert record["candidates"] == 5
+    assert record["variants"] == 3
+    assert run.totals["ad_copy_options_dropped"] == 2
+
+
+def test_labelled_ad_copy_is_pooled_without_labels_or_commentary():
+    output = (
+        "Here are three options:\n\n"
+        "**Ad Copy 1:** Travel safe in Sydney with live alerts.\n\n"
+        "**Ad Copy 2:** Explore the outback with confidence.\n\n"
+        "**Ad Copy 3:** Your family trip, planned and protected.\n\n"
+        "These copies balance safety and adventure. Let me know if you want changes."
+    )
+    tasks = [SimpleNamespace(description="Write ad copy\n", output=output)]
+    result = fan_out_ad_copy(tasks, lambda task, context: task.output, None, top_n=3, embedder=HashingEmbedder())
+
+    assert result.split("\n\n") == [
+        "Option 1: Travel safe in Sydney with live alerts.",
+        "Option 2: Your family trip, planned and protected.",
+        "Option 3: Explore the outback with confidence.",
+    ]
@@ -0,0 +1,18 @@
+from types import SimpleNamespace
+from web_fetch import decode_html, extract_main_text
+
+
+def response(content_type, encoding):
+    return SimpleNamespace(headers={"Content-Type": content_type}, encoding=encoding)
+
+
+def test_meta_charset_wins_over_the_default_guess():
+    body = '<html><head><meta charset="utf-8"><title>Café</title></head><body><p>Crème brûlée</p></body></html>'.encode("utf-8")
+    # What requests reports for text/html without a charset
+    html = decode_html(body, response("text/html", "ISO-8859-1"))
+    assert extract_main_text(html) == "Café\nCrème brûlée"
+
+
+def test_header_charset_is_used():
+    body = "<p>Café au lait</p>".encode("latin-1")
+    assert decode_html(body, response("text/html; charset=ISO-8859-1", "ISO-8859-1")) == "<p>Café au lait</p>"
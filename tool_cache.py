@@ -0,0 +1,163 @@
+import os
+import re
+import time
+import threading
+import logging
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from crewai_tools import SerperDevTool, ScrapeWebsiteTool
+from cache import DiskCache, hash_key
+from metrics import span, annotate
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+TOOL_CACHE_DIR = os.getenv("TOOL_CACHE_DIR", os.path.join(".cache", "tools"))
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", 24 * 60 * 60))
+TOOL_CACHE_MAX_ITEMS = int(os.getenv("TOOL_CACHE_MAX_ITEMS", 1000))
+
+WHITESPACE_RE = re.compile(r"\s+")
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+
+
+def normalize_query(query):
+    return WHITESPACE_RE.sub(" ", str(query or "")).strip().lower()
+
+
+def normalize_url(url):
+    url = str(url or "").strip()
+    if "://" not in url:
+        url = f"https://{url}"
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    ))
+    # The fragment never reaches the server, so it is dropped
+    return urlunsplit((parts.scheme.lower(), host, path, query, ""))
+
+
+class SingleFlight:
+    # Merges concurrent calls for the same key into one execution; the
+    # followers block until the leader finishes and share its result.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"event": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+
+        if not leader:
+            call["event"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"], True
+
+        try:
+            call["result"] = fn()
+            return call["result"], False
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["event"].set()
+
+
+class ToolCache:
+    def __init__(self, directory=TOOL_CACHE_DIR, ttl=TOOL_CACHE_TTL, max_items=TOOL_CACHE_MAX_ITEMS):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.disk = DiskCache(directory=directory, ttl=ttl)
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _remember(self, key, value, created_at=None):
+        # Expiry counts from when the value was first fetched, so a disk hit
+        # promoted to memory does not outlive its disk entry
+        with self._lock:
+            self._memory[key] = ((created_at or time.time()) + self.ttl, value)
+            if len(self._memory) > self.max_items:
+                # Dicts keep insertion order, so the first key is the oldest
+                self._memory.pop(next(iter(self._memory)))
+
+    def fetch(self, namespace, key, fn):
+        key = hash_key(namespace, key)
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] < time.time():
+                self._memory.pop(key, None)
+                entry = None
+        if entry:
+            self._count("hits")
+            annotate(cache="memory")
+            return entry[1]
+
+        stored = self.disk.get_entry(key)
+        if stored is not None and stored.get("value") is not None:
+            self._count("disk_hits")
+            annotate(cache="disk")
+            self._remember(key, stored["value"], created_at=stored.get("created_at"))
+            return stored["value"]
+
+        def load():
+            result = fn()
+            self._remember(key, result)
+            self.disk.set(key, result, meta={"namespace": namespace})
+            return result
+
+        result, shared = self._flight.do(key, load)
+        self._count("coalesced" if shared else "misses")
+        annotate(cache="coalesced" if shared else "miss")
+        return result
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self.disk.clear()
+
+
+# Shared by every agent and every session in the process
+tool_cache = ToolCache()
+
+
+class CachedSerperDevTool(SerperDevTool):
+    def _run(self, **kwargs):
+        query = kwargs.get("search_query") or kwargs.get("query")
+        options = [getattr(self, name, None) for name in ("search_type", "n_results", "country", "location", "locale")]
+        key = (normalize_query(query), options)
+        from ratelimit import limiter
+        search = super()._run
+        with span("tool", self.name):
+            # Misses go through the shared Serper rate limiter
+            return tool_cache.fetch("serper", key, lambda: limiter("serper").call(lambda: search(**kwargs)))
+
+
+class CachedScrapeWebsiteTool(ScrapeWebsiteTool):
+    # Serves the main-content extract from the shared fetcher instead of the
+    # whole page text, so prefetched pages cost no request at all.
+    def _run(self, **kwargs):
+        from web_fetch import web_fetcher
+        url = kwargs.get("website_url") or self.website_url
+        with span("tool", self.name):
+            return web_fetcher.text(url)
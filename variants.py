@@ -0,0 +1,79 @@
+import os
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from compaction import split_options
+from embeddings import get_embedder, cosine_similarity_matrix
+from metrics import annotate, count
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+# Candidates at least this similar to a kept variant are near-duplicates
+SIMILARITY_THRESHOLD = float(os.getenv("VARIANT_SIMILARITY_THRESHOLD", 0.85))
+MAX_VARIANTS = 8
+
+# Each extra candidate task is steered to a different angle
+ANGLES = [
+    "peace of mind and safety",
+    "adventure and discovery",
+    "families travelling together",
+    "first-time visitors",
+    "saving time while planning",
+    "local culture and hidden gems",
+    "last-minute trips",
+    "social proof from fellow travellers",
+]
+
+
+def diversify(task, index):
+    # The first candidate keeps the original prompt, so it shares its cache
+    # entry with runs that do not fan out.
+    if index:
+        task.description += f"\nWrite every option from the angle of {ANGLES[(index - 1) % len(ANGLES)]}.\n"
+    return task
+
+
+def select_diverse(vectors, top_n, threshold=SIMILARITY_THRESHOLD):
+    # Greedy farthest-first selection on the cosine similarity matrix: start
+    # from the first candidate, then repeatedly take the candidate least
+    # similar to everything kept so far, skipping near-duplicates.
+    similarity = cosine_similarity_matrix(vectors)
+    if not similarity.shape[0]:
+        return []
+    kept = [0]
+    closest = similarity[0].copy()
+    closest[0] = np.inf
+    while len(kept) < top_n:
+        candidate = int(np.argmin(closest))
+        if closest[candidate] >= threshold:
+            break
+        kept.append(candidate)
+        closest = np.maximum(closest, similarity[candidate])
+        closest[kept] = np.inf
+    return kept
+
+
+def fan_out_ad_copy(candidate_tasks, runner, context, top_n=3, embedder=None, threshold=SIMILARITY_THRESHOLD):
+    # Runs the candidate copy tasks concurrently, pools every option they
+    # return and keeps the top_n most diverse ones.
+    candidate_tasks = [diversify(task, index) for index, task in enumerate(candidate_tasks)]
+    with ThreadPoolExecutor(max_workers=len(candidate_tasks)) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, runner, task, context) for task in candidate_tasks]
+    outputs = []
+    for future in futures:
+        try:
+            outputs.append(future.result())
+        except Exception as e:
+            logging.error(f"Ad copy candidate failed: {e}")
+    if not outputs:
+        raise RuntimeError("Every ad copy candidate failed")
+
+    copies = list(dict.fromkeys(copy for output in outputs for copy in split_options(output, limit=None)))
+    vectors = (embedder or get_embedder()).embed(copies)
+    kept = select_diverse(vectors, top_n, threshold)
+    annotate(candidates=len(copies), variants=len(kept))
+    # Every pooled option not kept, whether a near-duplicate or past top_n
+    count("ad_copy_options_dropped", len(copies) - len(kept))
+    return "\n\n".join(f"Option {number}: {copies[index]}" for number, index in enumerate(kept, start=1))
@@ -0,0 +1,204 @@
+import os
+import re
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+import requests
+from bs4 import BeautifulSoup, UnicodeDammit
+from cache import DiskCache, hash_key
+from tool_cache import ToolCache, normalize_url
+from metrics import count
+
+# Set up logging to handle any potential errors
+logging.basicConfig(level=logging.ERROR)
+
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", os.path.join(".cache", "pages"))
+EXTRACT_CACHE_DIR = os.getenv("EXTRACT_CACHE_DIR", os.path.join(".cache", "extracts"))
+# Extracts younger than this are used without asking the server at all
+EXTRACT_FRESH_TTL = float(os.getenv("EXTRACT_FRESH_TTL", 60 * 60))
+# Validators and extracts are kept this long for conditional requests
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", 30 * 24 * 60 * 60))
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", 6000))
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", 8))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", 20))
+# Bytes read from a response before the rest is ignored
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", 2 * 1024 * 1024))
+USER_AGENT = "Mozilla/5.0 (compatible; TravelSafeResearch/1.0)"
+
+BOILERPLATE_TAGS = ("script", "style", "noscript", "svg", "iframe", "form", "nav", "header", "footer", "aside", "button")
+BOILERPLATE_RE = re.compile(r"cookie|consent|banner|popup|modal|newsletter|breadcrumb|share|social|menu|sidebar|footer|header|nav", re.I)
+BLOCK_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "blockquote", "td", "dt", "dd", "figcaption")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def extract_main_text(html, max_chars=EXTRACT_MAX_CHARS):
+    # Keeps the readable blocks of the main content and drops navigation,
+    # scripts and repeated boilerplate, up to max_chars.
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(attrs={"class": BOILERPLATE_RE}) + soup.find_all(attrs={"id": BOILERPLATE_RE}):
+        if tag.decomposed or tag.name in ("html", "body", "main", "article"):
+            continue
+        tag.decompose()
+
+    root = soup.find("main") or soup.find("article") or soup.body or soup
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+    lines = [title] if title else []
+    seen = set(lines)
+    size = len(title)
+    for block in root.find_all(BLOCK_TAGS):
+        # Nested blocks are covered by their innermost element
+        if block.find(BLOCK_TAGS):
+            continue
+        text = WHITESPACE_RE.sub(" ", block.get_text(" ", strip=True)).strip()
+        if len(text) < 3 or text in seen:
+            continue
+        if block.name.startswith("h"):
+            text = f"## {text}"
+        if size + len(text) + 1 > max_chars:
+            lines.append("[...]")
+            break
+        seen.add(text)
+        lines.append(text)
+        size += len(text) + 1
+
+    if len(lines) <= 1:
+        # Pages without semantic blocks fall back to their visible text
+        text = WHITESPACE_RE.sub(" ", root.get_text(" ", strip=True))
+        return text[:max_chars]
+    return "\n".join(lines)
+
+
+def decode_html(body, response):
+    # requests reports ISO-8859-1 for any text/html without a charset in the
+    # header, so that guess is ignored in favour of a <meta> declaration or
+    # detection from the bytes.
+    declared = "charset" in response.headers.get("Content-Type", "").lower()
+    html = UnicodeDammit(body, [response.encoding] if declared and response.encoding else [], is_html=True).unicode_markup
+    return html if html is not None else body.decode("utf-8", errors="replace")
+
+
+def same_site_links(html, base_url, limit=5):
+    host = urlsplit(base_url).netloc.lower().removeprefix("www.")
+    soup = BeautifulSoup(html, "html.parser")
+    links = []
+    for anchor in soup.find_all("a", href=True):
+        url = urljoin(base_url, anchor["href"])
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or parts.netloc.lower().removeprefix("www.") != host:
+            continue
+        url = normalize_url(url)
+        if url != normalize_url(base_url) and url not in links:
+            links.append(url)
+        if len(links) >= limit:
+            break
+    return links
+
+
+class WebFetcher:
+    # Fetches pages over one pooled session. The last extract of each page is
+    # stored with its ETag/Last-Modified validators, so a revalidation that
+    # returns 304 costs a round trip but no download or parsing.
+    def __init__(self, max_workers=FETCH_WORKERS, max_chars=EXTRACT_MAX_CHARS, timeout=FETCH_TIMEOUT):
+        self.max_workers = max_workers
+        self.max_chars = max_chars
+        self.timeout = timeout
+        self.pages = DiskCache(directory=PAGE_CACHE_DIR, ttl=PAGE_CACHE_TTL)
+        self.extracts = ToolCache(directory=EXTRACT_CACHE_DIR, ttl=EXTRACT_FRESH_TTL)
+        self._session = requests.Session()
+        self._session.headers["User-Agent"] = USER_AGENT
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+
+    def _download(self, url):
+        key = hash_key(normalize_url(url))
+        stored = self.pages.get(key)
+        headers = {}
+        if stored:
+            if stored.get("etag"):
+                headers["If-None-Match"] = stored["etag"]
+            if stored.get("last_modified"):
+                headers["If-Modified-Since"] = stored["last_modified"]
+
+        response = self._session.get(url, headers=headers, timeout=self.timeout, stream=True)
+        try:
+            if response.status_code == 304 and stored:
+                count("page_not_modified")
+                # Refreshes the stored entry's age
+                self.pages.set(key, stored)
+                self._index(stored)
+                return stored
+            response.raise_for_status()
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= FETCH_MAX_BYTES:
+                    break
+            body = b"".join(chunks)
+        finally:
+            response.close()
+
+        count("page_downloads")
+        html = decode_html(body, response)
+        page = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "text": extract_main_text(html, self.max_chars),
+            "links": same_site_links(html, url),
+        }
+        self.pages.set(key, page)
+        self._index(page)
+        return page
+
+    def _index(self, page):
+        # Scraped pages feed the research index agents search before the web
+        from research_index import research_index
+        try:
+            research_index.add(page["text"], source=page["url"])
+        except Exception as e:
+            logging.error(f"Failed to index {page['url']}: {e}")
+
+    def page(self, url):
+        # Concurrent requests for one URL share a single download
+        return self.extracts.fetch("page", normalize_url(url), lambda: self._download(url))
+
+    def text(self, url):
+        return self.page(url)["text"]
+
+    def fetch_all(self, urls, follow_links=0):
+        # Fetches urls concurrently, then up to follow_links same-site links
+        # of each, and returns {url: extract} in discovery order.
+        results = {}
+        level = list(dict.fromkeys(normalize_url(url) for url in urls))
+        for depth in range(follow_links + 1):
+            futures = {url: self._executor.submit(self.page, url) for url in level if url not in results}
+            next_level = []
+            for url, future in futures.items():
+                try:
+                    page = future.result()
+                except Exception as e:
+                    logging.error(f"Failed to fetch {url}: {e}")
+                    continue
+                results[url] = page["text"]
+                if depth < follow_links:
+                    next_level.extend(link for link in page["links"] if link not in results)
+            level = list(dict.fromkeys(next_level))
+        return results
+
+    def prefetch(self, urls, follow_links=1):
+        # Warms the extract cache in the background, e.g. at the start of a
+        # run. Runs on its own thread so it never holds a fetch worker.
+        thread = threading.Thread(target=self.fetch_all, args=(urls, follow_links), daemon=True)
+        thread.start()
+        return thread
+
+
+# Shared by every agent and every session in the process
+web_fetcher = WebFetcher()